@@ -0,0 +1,191 @@
+import time
+from collections import Counter
+from functools import partial, wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+RESOURCE_VERSION_KEY = 'resource_version:{}'
+RESPONSE_CACHE_COUNTER_KEY = 'recipes_response_cache:{}'
+
+# Попадания и промахи кеша ответов, еще не добавленные к общим счетчикам.
+response_cache_events = Counter()
+
+
+def get_resource_version(resource):
+    """
+    Версия ресурса (tags, ingredients, recipes или состояние
+    пользователя) - время последнего изменения в миллисекундах.
+    Если версия потеряна кешем, отсчет начинается с текущего момента,
+    поэтому новая версия всегда больше любой выданной ранее.
+    """
+    version_key = RESOURCE_VERSION_KEY.format(resource)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, time.time_ns() // 10 ** 6, timeout=None)
+        version = cache.get(version_key) or time.time_ns() // 10 ** 6
+    return version
+
+
+def get_request_resource_version(request, resource):
+    """
+    Версия ресурса, прочитанная из кеша не больше одного раза
+    за запрос; без запроса (request=None) читается из кеша.
+    """
+    if request is None:
+        return get_resource_version(resource)
+    versions = request.__dict__.setdefault('resource_versions', {})
+    if resource not in versions:
+        versions[resource] = get_resource_version(resource)
+    return versions[resource]
+
+
+def set_next_resource_version(resource):
+    """
+    Записывает следующую версию ресурса.
+    """
+    version_key = RESOURCE_VERSION_KEY.format(resource)
+    cache.set(
+        version_key,
+        max(time.time_ns() // 10 ** 6, get_resource_version(resource) + 1),
+        timeout=None,
+    )
+
+
+def bump_resource_version(resource):
+    """
+    Отмечает изменение ресурса: его версия становится не меньше
+    текущего времени и строго больше предыдущей. Версия меняется после
+    фиксации транзакции, иначе запрос, прочитавший старые данные,
+    сохранил бы их в кеш под новой версией.
+    """
+    transaction.on_commit(partial(set_next_resource_version, resource))
+
+
+def count_response_cache_event(event):
+    """
+    Увеличивает счетчик попаданий (hits) или промахов (misses) кеша.
+    Счетчики копятся в процессе и добавляются к общим раз
+    в RESPONSE_CACHE_STATS_FLUSH_EVERY событий, чтобы попадание
+    в кеш не требовало записи.
+    """
+    response_cache_events[event] += 1
+    if (
+        sum(response_cache_events.values())
+        >= settings.RESPONSE_CACHE_STATS_FLUSH_EVERY
+    ):
+        flush_response_cache_events()
+
+
+def flush_response_cache_events():
+    """
+    Добавляет накопленные в процессе события к общим счетчикам.
+    """
+    events = dict(response_cache_events)
+    response_cache_events.clear()
+    for event, count in events.items():
+        counter_key = RESPONSE_CACHE_COUNTER_KEY.format(event)
+        if cache.add(counter_key, count, timeout=None):
+            continue
+        try:
+            cache.incr(counter_key, count)
+        except ValueError:
+            cache.set(counter_key, count, timeout=None)
+
+
+def get_response_cache_stats():
+    """
+    Счетчики попаданий и промахов кеша ответов.
+    """
+    flush_response_cache_events()
+    return {
+        event: cache.get(RESPONSE_CACHE_COUNTER_KEY.format(event), 0)
+        for event in ('hits', 'misses')
+    }
+
+
+def get_response_cache_key(request):
+    """
+    Ключ кеша: версия рецептов, хост, путь и нормализованная
+    строка запроса.
+    """
+    query_string = urlencode(
+        sorted(
+            (param, value)
+            for param, values in request.query_params.lists()
+            for value in values
+        )
+    )
+    return (
+        'recipes_response_cache:'
+        f'{get_request_resource_version(request, "recipes")}:'
+        f'{request.get_host()}{request.path}?{query_string}'
+    )
+
+
+def cache_anonymous_response(view_method):
+    """
+    Кеширует ответы на запросы анонимных пользователей, которые
+    одинаковы для всех посетителей.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return view_method(self, request, *args, **kwargs)
+        cache_key = get_response_cache_key(request)
+        cached_data = cache.get(cache_key)
+        if cached_data is not None:
+            count_response_cache_event('hits')
+            response = Response(cached_data)
+            response['X-Cache'] = 'HIT'
+            return response
+        count_response_cache_event('misses')
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(
+                cache_key,
+                response.data,
+                settings.RECIPES_RESPONSE_CACHE_TIMEOUT,
+            )
+        response['X-Cache'] = 'MISS'
+        return response
+    return wrapper
+
+
+def conditional_response(resource, per_user=False):
+    """
+    Добавляет к ответу слабый ETag и Last-Modified по версии ресурса
+    и отвечает 304 на If-None-Match/If-Modified-Since до сериализации.
+    При per_user=True учитывается и состояние пользователя (избранное,
+    список покупок, подписки), от которого зависит ответ.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            versions = [get_request_resource_version(request, resource)]
+            owner = 'anonymous'
+            if per_user and request.user.is_authenticated:
+                owner = request.user.pk
+                versions.append(
+                    get_request_resource_version(request, f'user:{owner}')
+                )
+            etag = f'W/"{resource}-{owner}-{"-".join(map(str, versions))}"'
+            last_modified = max(versions) // 1000
+            not_modified = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if not_modified is not None:
+                return not_modified
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                response['ETag'] = etag
+                response['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+DATABASE_CACHE_BACKEND = 'django.core.cache.backends.db.DatabaseCache'
+
+
+@register()
+def check_cache_backend(app_configs, **kwargs):
+    """
+    Версии ресурсов читаются в каждом запросе: кеш в базе данных
+    приложения добавил бы к каждому запросу лишние обращения к ней.
+    """
+    if settings.CACHES['default']['BACKEND'] != DATABASE_CACHE_BACKEND:
+        return []
+    return [
+        Error(
+            'Кеш в базе данных приложения не поддерживается.',
+            hint=(
+                'Укажите в CACHE_BACKEND memcached или Redis '
+                '(LocMemCache - только для одного процесса).'
+            ),
+            id='api.E001',
+        )
+    ]
@@ -0,0 +1,198 @@
+import csv
+import json
+from functools import lru_cache
+from io import BytesIO
+from itertools import islice
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.negotiation import DefaultContentNegotiation
+
+EXPORTERS = {}
+PDF_FONT_NAME = 'ShoppingListFont'
+
+
+def register_exporter(exporter_class):
+    """
+    Регистрирует класс выгрузки списка покупок под его форматом.
+    """
+    EXPORTERS[exporter_class.format] = exporter_class
+    return exporter_class
+
+
+def get_exporter(export_format):
+    """
+    Класс выгрузки для формата (txt, csv, json, pdf) или None.
+    """
+    return EXPORTERS.get(export_format)
+
+
+class ExportFormatNegotiation(DefaultContentNegotiation):
+    """
+    Параметр format выбирает формат выгрузки, а не рендерер DRF.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class ShoppingListExporter:
+    """
+    Базовый класс выгрузки списка покупок. Строки списка (словари
+    name/measurement_unit/amount) читаются из итератора, результат
+    отдается частями, поэтому выгрузка подходит для StreamingHttpResponse
+    и может использоваться вне запроса (например, для записи в файл).
+    """
+    format = None
+    content_type = None
+
+    def __init__(self, username, created_at):
+        self.username = username
+        self.created_at = created_at
+
+    def get_filename(self):
+        """
+        Имя файла выгрузки.
+        """
+        return (
+            f'Shopping_List({self.created_at:%d.%m.%Y (%H:%M)}).'
+            f'{self.format}'
+        )
+
+    def get_lines(self, rows):
+        """
+        Текстовые строки списка покупок.
+        """
+        title = f'Список покупок на {self.created_at:%d.%m.%Y (%H:%M)}'
+        yield 'Пользователь: ' + self.username
+        yield title
+        yield '-' * len(title)
+        yield ''
+        for row in rows:
+            yield (
+                f'* {row["name"]} ({row["measurement_unit"]})'
+                f' - {row["amount"]}'
+            )
+        yield ''
+        yield f'сервис "Продуктовый помощник" {self.created_at.year} г.'
+
+    def export(self, rows):
+        """
+        Итератор по частям (bytes) выгрузки.
+        """
+        raise NotImplementedError
+
+
+@register_exporter
+class TxtExporter(ShoppingListExporter):
+    format = 'txt'
+    content_type = 'text/plain; charset=UTF-8'
+
+    def export(self, rows):
+        for line in self.get_lines(rows):
+            yield f'{line}\n'.encode()
+
+
+class EchoBuffer:
+    """
+    Буфер для csv.writer, возвращающий записанную строку.
+    """
+
+    def write(self, value):
+        return value
+
+
+@register_exporter
+class CsvExporter(ShoppingListExporter):
+    format = 'csv'
+    content_type = 'text/csv; charset=UTF-8'
+
+    def export(self, rows):
+        writer = csv.writer(EchoBuffer())
+        yield writer.writerow(('name', 'measurement_unit', 'amount')).encode()
+        for row in rows:
+            yield writer.writerow(
+                (row['name'], row['measurement_unit'], row['amount'])
+            ).encode()
+
+
+@register_exporter
+class JsonExporter(ShoppingListExporter):
+    format = 'json'
+    content_type = 'application/json'
+
+    def export(self, rows):
+        yield (
+            '{"user": %s, "created_at": %s, "ingredients": ['
+            % (
+                json.dumps(self.username, ensure_ascii=False),
+                json.dumps(self.created_at.isoformat()),
+            )
+        ).encode()
+        separator = ''
+        for row in rows:
+            yield (
+                separator + json.dumps(
+                    {
+                        'name': row['name'],
+                        'measurement_unit': row['measurement_unit'],
+                        'amount': row['amount'],
+                    },
+                    ensure_ascii=False,
+                )
+            ).encode()
+            separator = ', '
+        yield b']}\n'
+
+
+@lru_cache(maxsize=None)
+def get_pdf_font():
+    """
+    Регистрирует шрифт с кириллицей из настройки SHOPPING_LIST_PDF_FONT;
+    в PDF встраивается только подмножество использованных символов.
+    """
+    try:
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT_NAME, settings.SHOPPING_LIST_PDF_FONT)
+        )
+    except TTFError:
+        return 'Helvetica'
+    return PDF_FONT_NAME
+
+
+@register_exporter
+class PdfExporter(ShoppingListExporter):
+    """
+    Выгрузка в PDF с текстом (его можно выделять и искать). Документ
+    собирается в памяти и отдается целиком: сжатые страницы текста
+    занимают десятки килобайт даже для длинных списков.
+    """
+    format = 'pdf'
+    content_type = 'application/pdf'
+    margin = 40
+    font_size = 14
+    line_height = 20
+
+    def export(self, rows):
+        buffer = BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
+        pdf.setTitle(f'Список покупок {self.username}')
+        pdf.setAuthor(self.username)
+        font = get_pdf_font()
+        width, height = A4
+        lines_per_page = int((height - 2 * self.margin) // self.line_height)
+        lines = self.get_lines(rows)
+        page_lines = list(islice(lines, lines_per_page))
+        while page_lines:
+            text = pdf.beginText(self.margin, height - self.margin)
+            text.setFont(font, self.font_size, leading=self.line_height)
+            for line in page_lines:
+                text.textLine(line)
+            pdf.drawText(text)
+            pdf.showPage()
+            page_lines = list(islice(lines, lines_per_page))
+        pdf.save()
+        yield buffer.getvalue()
@@ -1,21 +1,94 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import (Case, CharField, F, FloatField, Func,
+                              IntegerField, Q, Value, When)
+from django.db.models.functions import Length
+from django.db.models.lookups import PostgresOperatorLookup
 from django_filters import rest_framework as filters
 from django_filters.rest_framework import FilterSet
 
+from api.cache import get_request_resource_version
+from api.ingredient_index import ingredient_index
 from recipes.models import FavoriteRecipe, Ingredient, ShoppingCart, Tag
 
 User = get_user_model()
 
 
+@CharField.register_lookup
+class TrigramWordSimilar(PostgresOperatorLookup):
+    """
+    Оператор pg_trgm "%>": в строке есть слово, похожее на значение
+    не меньше порога pg_trgm.word_similarity_threshold; обслуживается
+    GIN-индексом ingredient_name_trgm_idx.
+    """
+    lookup_name = 'trigram_word_similar'
+    postgres_operator = '%%>'
+
+
+class TrigramWordSimilarity(Func):
+    """
+    Функция pg_trgm word_similarity(запрос, поле).
+    """
+    function = 'WORD_SIMILARITY'
+    output_field = FloatField()
+
+
 class IngredientSearchFilter(FilterSet):
     """
-    Для поиска ингредиентов на фронтенде.
+    Для поиска ингредиентов на фронтенде: name - по началу названия,
+    search - нечеткий поиск с ранжированием (опечатки, слова внутри
+    названия).
     """
     name = filters.CharFilter(lookup_expr='istartswith')
+    search = filters.CharFilter(method='get_fuzzy_search')
 
     class Meta:
         model = Ingredient
-        fields = ('name', )
+        fields = ('name', 'search')
+
+    def get_fuzzy_search(self, queryset, filter_name, filter_value):
+        """
+        Ингредиенты, похожие на запрос: сначала совпадения по началу
+        названия, затем по убыванию сходства; не больше
+        INGREDIENT_SEARCH_LIMIT результатов.
+        """
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        if connection.vendor != 'postgresql':
+            ranked_ids = [
+                ingredient['id']
+                for ingredient in ingredient_index.fuzzy_search(
+                    filter_value,
+                    limit,
+                    get_request_resource_version(self.request, 'ingredients'),
+                )
+            ]
+            if not ranked_ids:
+                return queryset.none()
+            return queryset.filter(pk__in=ranked_ids).order_by(
+                Case(
+                    *[
+                        When(pk=pk, then=position)
+                        for position, pk in enumerate(ranked_ids)
+                    ],
+                    output_field=IntegerField(),
+                )
+            )
+        # Порог "%>" задается из настройки при подключении к базе
+        # (api.signals.set_trigram_similarity_threshold).
+        return queryset.filter(
+            Q(name__istartswith=filter_value)
+            | Q(name__trigram_word_similar=filter_value)
+        ).annotate(
+            is_prefix=Case(
+                When(name__istartswith=filter_value, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+            similarity=TrigramWordSimilarity(Value(filter_value), F('name')),
+        ).order_by('-is_prefix', '-similarity', Length('name'), 'name')[
+            :limit
+        ]
 
 
 class RecipesFilter(filters.FilterSet):
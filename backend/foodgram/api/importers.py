@@ -0,0 +1,265 @@
+import codecs
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import DatabaseError, transaction
+from rest_framework import serializers
+
+from api.cache import bump_resource_version
+from api.serializers import RecipeImageField
+from recipes.feeds import push_recipes_to_feeds
+from recipes.images import change_file_references
+from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
+from recipes.readers import PrependedStream, iter_json_array, iter_ndjson
+from recipes.validators import validate_for_nonpunctuation_marks
+
+
+def iter_recipe_records(binary_stream):
+    """
+    Записи рецептов из файла в формате JSON-массива или NDJSON.
+    """
+    text_stream = codecs.getreader('utf-8')(binary_stream)
+    head = ''
+    while not head.strip():
+        char = text_stream.read(1)
+        if not char:
+            return
+        head += char
+    stream = PrependedStream(head, text_stream)
+    if head.strip() == '[':
+        yield from iter_json_array(stream)
+    else:
+        yield from iter_ndjson(stream)
+
+
+class RecipeImporter:
+    """
+    Массовый импорт рецептов: записи проверяются пакетами, теги и
+    ингредиенты определяются по заранее загруженным словарям, рецепты,
+    связи с тегами и ингредиенты создаются через bulk_create, каждый
+    пакет - в отдельной транзакции. Результат - отчет с числом
+    созданных рецептов и ошибками по номерам записей.
+    """
+
+    def __init__(self, author, batch_size=None):
+        self.author = author
+        self.batch_size = batch_size or settings.RECIPES_IMPORT_BATCH_SIZE
+        self.image_field = RecipeImageField()
+        self.report = {'created': 0, 'errors': []}
+        self.tags = {}
+        for tag_id, slug in Tag.objects.values_list('id', 'slug'):
+            self.tags[tag_id] = self.tags[str(tag_id)] = self.tags[slug] = (
+                tag_id
+            )
+        self.ingredients = {}
+        for ingredient_id, name, unit in Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit'
+        ):
+            self.ingredients[ingredient_id] = ingredient_id
+            self.ingredients[(name, unit)] = ingredient_id
+        self.recipe_names = set()
+
+    def run(self, records):
+        """
+        Импортирует записи и возвращает отчет.
+        """
+        numbered_records = enumerate(records, start=1)
+        batch = list(islice(numbered_records, self.batch_size))
+        while batch:
+            self.import_batch(batch)
+            batch = list(islice(numbered_records, self.batch_size))
+        if self.report['created']:
+            bump_resource_version('recipes')
+        return self.report
+
+    def add_error(self, row, errors):
+        self.report['errors'].append({'row': row, 'errors': errors})
+
+    def import_batch(self, batch):
+        """
+        Проверяет пакет записей и сохраняет корректные в одной транзакции.
+        """
+        self.recipe_names = set(
+            Recipe.objects.filter(
+                name__in=[
+                    record.get('name') for _, record in batch
+                    if isinstance(record, dict)
+                ]
+            ).values_list('name', flat=True)
+        ) | self.recipe_names
+        valid_rows = []
+        for row, record in batch:
+            data, errors = self.validate_record(record)
+            if errors:
+                self.add_error(row, errors)
+                continue
+            self.recipe_names.add(data['name'])
+            valid_rows.append((row, data))
+        if not valid_rows:
+            return
+        try:
+            with transaction.atomic():
+                self.save_batch([data for _, data in valid_rows])
+        except DatabaseError as error:
+            for row, data in valid_rows:
+                self.recipe_names.discard(data['name'])
+                self.add_error(row, {'non_field_errors': [str(error)]})
+            return
+        self.report['created'] += len(valid_rows)
+
+    def save_batch(self, rows):
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=self.author,
+                name=data['name'],
+                text=data['text'],
+                cooking_time=data['cooking_time'],
+                image=data['image'],
+            )
+            for data in rows
+        )
+        if any(recipe.pk is None for recipe in recipes):
+            recipe_ids = dict(
+                Recipe.objects.filter(
+                    name__in=[recipe.name for recipe in recipes]
+                ).values_list('name', 'id')
+            )
+            for recipe in recipes:
+                recipe.pk = recipe_ids[recipe.name]
+        # bulk_create не отправляет сигналы, ссылки на файлы - вручную.
+        change_file_references(
+            new_names=[recipe.image.name for recipe in recipes]
+        )
+        push_recipes_to_feeds(recipes)
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+            for recipe, data in zip(recipes, rows)
+            for tag_id in data['tags']
+        )
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(
+                recipe_id=recipe.pk,
+                ingredient_id=ingredient_id,
+                amount=amount,
+            )
+            for recipe, data in zip(recipes, rows)
+            for ingredient_id, amount in data['ingredients']
+        )
+
+    def validate_record(self, record):
+        """
+        Проверяет запись; возвращает очищенные данные и ошибки по полям.
+        """
+        if isinstance(record, ValueError):
+            return None, {'non_field_errors': [str(record)]}
+        if not isinstance(record, dict):
+            return None, {
+                'non_field_errors': ['Запись рецепта должна быть объектом.'],
+            }
+        data, errors = {}, {}
+        for field in ('name', 'text', 'cooking_time', 'tags', 'ingredients',
+                      'image'):
+            if field == 'image' and errors:
+                break
+            try:
+                data[field] = getattr(self, f'clean_{field}')(
+                    record.get(field)
+                )
+            except serializers.ValidationError as error:
+                errors[field] = error.detail
+            except DjangoValidationError as error:
+                errors[field] = error.messages
+        return data, errors
+
+    def clean_name(self, name):
+        if not name or not isinstance(name, str):
+            raise serializers.ValidationError('Обязательное поле.')
+        if len(name) > settings.LIMIT_TAG_INGREDIENT_RECIPE_SLUG_NAME:
+            raise serializers.ValidationError('Слишком длинное название.')
+        validate_for_nonpunctuation_marks(name)
+        if name in self.recipe_names:
+            raise serializers.ValidationError(
+                'Рецепт с таким названием уже существует!'
+            )
+        return name
+
+    def clean_text(self, text):
+        if not text or not isinstance(text, str):
+            raise serializers.ValidationError('Обязательное поле.')
+        return text
+
+    def clean_cooking_time(self, cooking_time):
+        try:
+            cooking_time = int(cooking_time)
+        except (TypeError, ValueError):
+            raise serializers.ValidationError('Ожидается целое число.')
+        if not 1 <= cooking_time <= 32767:
+            raise serializers.ValidationError(
+                'Время приготовления должно быть от 1 до 32767 минут!'
+            )
+        return cooking_time
+
+    def clean_tags(self, tags):
+        if not tags or not isinstance(tags, list):
+            raise serializers.ValidationError('Не выбраны теги для рецепта!')
+        unknown_tags = [tag for tag in tags if str(tag) not in self.tags]
+        if unknown_tags:
+            raise serializers.ValidationError(
+                f'Неизвестные теги: {", ".join(map(str, unknown_tags))}!'
+            )
+        tags_ids = [self.tags[str(tag)] for tag in tags]
+        if len(set(tags_ids)) != len(tags_ids):
+            raise serializers.ValidationError('Теги не должны повторяться!')
+        return tags_ids
+
+    def clean_ingredients(self, ingredients):
+        if not ingredients or not isinstance(ingredients, list):
+            raise serializers.ValidationError(
+                'Необходим хотя бы один ингредиент!'
+            )
+        amounts = {}
+        for ingredient in ingredients:
+            ingredient_id = self.resolve_ingredient(ingredient)
+            if ingredient_id in amounts:
+                raise serializers.ValidationError(
+                    'Ингредиенты не должны повторяться!'
+                )
+            amounts[ingredient_id] = self.clean_amount(ingredient['amount'])
+        return list(amounts.items())
+
+    def resolve_ingredient(self, ingredient):
+        if not isinstance(ingredient, dict) or 'amount' not in ingredient:
+            raise serializers.ValidationError(
+                'Ингредиент задается id или парой name/measurement_unit '
+                'и количеством amount.'
+            )
+        key = ingredient.get('id')
+        if key is None:
+            key = (ingredient.get('name'), ingredient.get('measurement_unit'))
+        if not isinstance(key, (int, tuple)) or key not in self.ingredients:
+            raise serializers.ValidationError(
+                f'Ингредиент {key} не найден!'
+            )
+        return self.ingredients[key]
+
+    @staticmethod
+    def clean_amount(amount):
+        try:
+            amount = int(amount)
+        except (TypeError, ValueError):
+            raise serializers.ValidationError(
+                'Количество ингредиента должно быть целым числом!'
+            )
+        if not 1 <= amount <= settings.LIMIT_INGREDIENT_AMOUNT:
+            raise serializers.ValidationError(
+                'Количество ингредиента должно быть от 1 до '
+                f'{settings.LIMIT_INGREDIENT_AMOUNT}!'
+            )
+        return amount
+
+    def clean_image(self, image):
+        image = self.image_field.to_internal_value(image)
+        if image is None:
+            raise serializers.ValidationError('Обязательное поле.')
+        return image
@@ -0,0 +1,123 @@
+import re
+from bisect import bisect_left, bisect_right
+from threading import Lock
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from api.cache import get_resource_version
+from recipes.models import Ingredient
+
+
+class IngredientPrefixIndex:
+    """
+    Отсортированный индекс названий ингредиентов (без учета регистра)
+    в памяти процесса для автодополнения: поиск по началу названия
+    выполняется бинарным поиском, без обращения к базе данных.
+    Индекс перестраивается при изменении версии ресурса ingredients.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.keys = []
+        self.trigrams = []
+        self.ingredients = []
+        self.lock = Lock()
+
+    def build(self, version):
+        """
+        Загружает все ингредиенты и строит индекс.
+        """
+        rows = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda row: (row['name'].casefold(), row['id']),
+        )
+        self.keys = [row['name'].casefold() for row in rows]
+        self.trigrams = [get_trigrams(row['name']) for row in rows]
+        self.ingredients = rows
+        self.version = version
+
+    def refresh(self, version=None):
+        """
+        Перестраивает индекс, если ингредиенты изменились. Версию,
+        уже прочитанную в запросе, можно передать, чтобы не читать
+        ее из кеша повторно.
+        """
+        if version is None:
+            version = get_resource_version('ingredients')
+        if self.version == version:
+            return
+        with self.lock:
+            if self.version != version:
+                self.build(version)
+
+    def warm_up(self):
+        """
+        Строит индекс при запуске процесса, чтобы первый запрос
+        автодополнения не ждал загрузки; до применения миграций
+        индекс строится при первом запросе.
+        """
+        try:
+            self.refresh()
+        except DatabaseError:
+            pass
+
+    def search(self, prefix, version=None):
+        """
+        Ингредиенты, название которых начинается с prefix.
+        """
+        self.refresh(version)
+        prefix = prefix.casefold()
+        keys, ingredients = self.keys, self.ingredients
+        start = bisect_left(keys, prefix)
+        end = bisect_right(keys, prefix + chr(0x10FFFF), lo=start)
+        return ingredients[start:end]
+
+    def fuzzy_search(self, query, limit, version=None):
+        """
+        Нечеткий поиск по триграммам для СУБД без pg_trgm: сначала
+        совпадения по началу названия, затем по убыванию сходства.
+        """
+        self.refresh(version)
+        query = query.casefold()
+        query_trigrams = get_trigrams(query)
+        threshold = settings.INGREDIENT_SEARCH_SIMILARITY_THRESHOLD
+        matches = []
+        for key, trigrams, ingredient in zip(
+            self.keys, self.trigrams, self.ingredients
+        ):
+            similarity = get_word_similarity(query_trigrams, trigrams)
+            is_prefix = key.startswith(query)
+            if is_prefix or similarity >= threshold:
+                matches.append(
+                    (not is_prefix, -similarity, len(key), key, ingredient)
+                )
+        matches.sort(key=lambda match: match[:4])
+        return [match[4] for match in matches[:limit]]
+
+
+def get_trigrams(text):
+    """
+    Набор триграмм строки по правилам pg_trgm: слова в нижнем
+    регистре, дополненные двумя пробелами в начале и одним в конце.
+    """
+    trigrams = set()
+    for word in re.findall(r'\w+', text.casefold()):
+        padded_word = f'  {word} '
+        trigrams.update(
+            padded_word[i:i + 3] for i in range(len(padded_word) - 2)
+        )
+    return trigrams
+
+
+def get_word_similarity(query_trigrams, name_trigrams):
+    """
+    Доля триграмм запроса, встречающихся в названии (приближение
+    функции word_similarity из pg_trgm).
+    """
+    if not query_trigrams:
+        return 0
+    return len(query_trigrams & name_trigrams) / len(query_trigrams)
+
+
+ingredient_index = IngredientPrefixIndex()
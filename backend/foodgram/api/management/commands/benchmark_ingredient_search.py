@@ -0,0 +1,102 @@
+import os
+import random
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from api.cache import get_resource_version
+from api.ingredient_index import IngredientPrefixIndex
+from api.utils import measure
+from recipes.management.commands.load_default_data import (DATA_DIRECTORY,
+                                                           iter_data_rows)
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск ингредиентов по началу названия через индекс '
+        'в памяти и через запрос к базе. Ингредиенты из файла '
+        'добавляются в транзакции, которая затем откатывается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ingredients',
+            default=os.path.join(DATA_DIRECTORY, 'ingredients.json'),
+            help='Файл с ингредиентами (.csv без заголовка или .json).',
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=200,
+            help='Число поисковых запросов в одном замере.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Число повторов каждого замера.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            rows = list(
+                iter_data_rows(
+                    options['ingredients'], ('name', 'measurement_unit')
+                )
+            )
+        except FileNotFoundError:
+            raise CommandError(
+                f'Файла {options["ingredients"]} не существует!'
+            )
+        if not rows:
+            raise CommandError('В файле нет ингредиентов!')
+        random.seed(0)
+        prefixes = [
+            row['name'][:random.choice((1, 2, 3, 5))]
+            for row in random.choices(rows, k=options['queries'])
+        ]
+        with transaction.atomic():
+            Ingredient.objects.bulk_create(
+                (Ingredient(**row) for row in rows),
+                batch_size=1000,
+                ignore_conflicts=True,
+            )
+            self.report(prefixes, options['repeat'])
+            transaction.set_rollback(True)
+
+    def report(self, prefixes, repeat):
+        index = IngredientPrefixIndex()
+        version = get_resource_version('ingredients')
+        build_time = measure(lambda: index.build(version), repeat)
+        found = sum(len(index.search(prefix)) for prefix in prefixes)
+        queryset = Ingredient.objects.values('id', 'name', 'measurement_unit')
+        orm_time = measure(
+            lambda: [
+                list(queryset.filter(name__istartswith=prefix))
+                for prefix in prefixes
+            ],
+            repeat,
+        )
+        index_time = measure(
+            lambda: [index.search(prefix, version) for prefix in prefixes],
+            repeat,
+        )
+        self.stdout.write(
+            f'Ингредиентов в индексе: {len(index.keys)}, '
+            f'запросов: {len(prefixes)}, найдено строк: {found}.'
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Построение индекса: {build_time:.1f} мс')
+        )
+        for name, milliseconds in (
+            ('Запрос к базе (istartswith)', orm_time),
+            ('Индекс в памяти', index_time),
+        ):
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'{name}: {milliseconds:.1f} мс, '
+                    f'{milliseconds * 1000 / len(prefixes):.0f} мкс '
+                    f'на запрос'
+                )
+            )
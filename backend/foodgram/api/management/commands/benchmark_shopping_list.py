@@ -0,0 +1,137 @@
+import random
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Sum
+
+from api.exporters import TxtExporter
+from api.utils import get_shopping_list, measure
+from recipes.models import Ingredient, IngredientAmount, Recipe, ShoppingCart
+from recipes.units import normalize_shopping_list
+from recipes.utils import rebuild_shopping_lists
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время сборки и выгрузки списка покупок для большой '
+        'корзины. Тестовые данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=500,
+            help='Число рецептов в корзине.',
+        )
+        parser.add_argument(
+            '--ingredients',
+            type=int,
+            default=10,
+            help='Число ингредиентов в одном рецепте.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Число повторов каждого замера.',
+        )
+
+    def handle(self, *args, **options):
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if len(ingredient_ids) < options['ingredients']:
+            raise CommandError(
+                'Недостаточно ингредиентов в базе, '
+                'выполните load_default_data!'
+            )
+        with transaction.atomic():
+            user = self.fill_cart(ingredient_ids, options)
+            self.report(user, options['repeat'])
+            transaction.set_rollback(True)
+
+    def fill_cart(self, ingredient_ids, options):
+        """
+        Создает пользователя с корзиной из заданного числа рецептов.
+        """
+        user = User.objects.create_user(
+            email='benchmark@foodgram.ru',
+            username='shopping_list_benchmark',
+            first_name='Benchmark',
+            last_name='Benchmark',
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=user,
+                name=f'Рецепт для замера {number}',
+                text='Рецепт для замера списка покупок.',
+                cooking_time=1,
+            )
+            for number in range(options['recipes'])
+        )
+        recipe_ids = Recipe.objects.filter(author=user).values_list(
+            'id', flat=True
+        )
+        random.seed(0)
+        IngredientAmount.objects.bulk_create(
+            (
+                IngredientAmount(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=random.randint(1, 500),
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in random.sample(
+                    ingredient_ids, options['ingredients']
+                )
+            ),
+            batch_size=1000,
+        )
+        ShoppingCart.objects.bulk_create(
+            (ShoppingCart(user=user, recipe_id=pk) for pk in recipe_ids),
+            batch_size=1000,
+        )
+        rebuild_shopping_lists([user.id])
+        self.stdout.write(
+            f'Корзина: {len(recipes)} рецептов, '
+            f'{len(recipes) * options["ingredients"]} строк ингредиентов.'
+        )
+        return user
+
+    def report(self, user, repeat):
+        exporter = TxtExporter(user.username, datetime.now())
+        results = {
+            'Агрегация корзины при чтении': measure(
+                lambda: list(
+                    ShoppingCart.objects.filter(user=user).values(
+                        name=F('recipe__ingredients__ingredient__name'),
+                        measurement_unit=F(
+                            'recipe__ingredients__ingredient__measurement_unit'
+                        ),
+                    ).annotate(
+                        amount=Sum('recipe__ingredients__amount'),
+                    ).order_by('name', 'measurement_unit')
+                ),
+                repeat,
+            ),
+            'Чтение итогов ShoppingListItem': measure(
+                lambda: list(get_shopping_list(user)), repeat
+            ),
+            'Выгрузка в txt': measure(
+                lambda: b''.join(
+                    exporter.export(
+                        normalize_shopping_list(
+                            get_shopping_list(user).iterator()
+                        )
+                    )
+                ),
+                repeat,
+            ),
+        }
+        for name, milliseconds in results.items():
+            self.stdout.write(
+                self.style.SUCCESS(f'{name}: {milliseconds:.1f} мс')
+            )
@@ -0,0 +1,58 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+
+from api.importers import RecipeImporter, iter_recipe_records
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Массовый импорт рецептов из файла в формате JSON-массива '
+        'или NDJSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу с рецептами.')
+        parser.add_argument(
+            '--author',
+            required=True,
+            help='Электронная почта автора импортируемых рецептов.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Число рецептов в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            author = User.objects.get(email=options['author'])
+        except User.DoesNotExist:
+            raise CommandError(
+                f'Пользователь {options["author"]} не найден!'
+            )
+        try:
+            with open(options['path'], 'rb') as recipes_file:
+                report = RecipeImporter(
+                    author=author,
+                    batch_size=options['batch_size'],
+                ).run(iter_recipe_records(recipes_file))
+        except FileNotFoundError:
+            raise CommandError(f'Файла {options["path"]} не существует!')
+        for error in report['errors']:
+            self.stdout.write(
+                self.style.ERROR(
+                    f'Запись {error["row"]}: '
+                    f'{json.dumps(error["errors"], ensure_ascii=False)}'
+                )
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Импортировано рецептов: {report["created"]}, '
+                f'ошибок: {len(report["errors"])}'
+            )
+        )
@@ -1,9 +1,130 @@
-from rest_framework.pagination import PageNumberPagination
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+def exact_count(queryset):
+    """
+    Точное число объектов (SELECT COUNT(*)).
+    """
+    return queryset.count()
+
+
+def cached_count(queryset):
+    """
+    Число объектов, закешированное на PAGINATION_COUNT_CACHE_TIMEOUT
+    секунд; ключом служит SQL запроса, то есть нормализованный набор
+    фильтров (включая пользователя для is_favorited и т.п.).
+    """
+    sql, params = queryset.query.sql_with_params()
+    cache_key = 'pagination_count:' + md5(
+        f'{sql}{params}'.encode()
+    ).hexdigest()
+    count = cache.get(cache_key)
+    if count is None:
+        count = queryset.count()
+        cache.set(
+            cache_key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT
+        )
+    return count
+
+
+def estimated_count(queryset):
+    """
+    Оценка числа объектов по плану запроса PostgreSQL; для небольших
+    выборок (ниже PAGINATION_COUNT_ESTIMATE_THRESHOLD) и на других СУБД
+    выполняется точный подсчет.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    estimate = int(plan[0]['Plan']['Plan Rows'])
+    if estimate < settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD:
+        return queryset.count()
+    return estimate
+
+
+COUNT_STRATEGIES = {
+    'exact': exact_count,
+    'cached': cached_count,
+    'estimated': estimated_count,
+}
+
+
+class CountStrategyPaginator(Paginator):
+    """
+    Пагинатор Django, считающий общее число объектов по стратегии
+    из настройки PAGINATION_COUNT_STRATEGY.
+    """
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return len(self.object_list)
+        return COUNT_STRATEGIES[settings.PAGINATION_COUNT_STRATEGY](
+            self.object_list
+        )
+
+
+class CursorPaginationWithLimit(CursorPagination):
+    """
+    Курсорный пагинатор для бесконечной прокрутки: страница выбирается
+    по ключу сортировки (по умолчанию (pub_date, id), как у рецептов)
+    без подсчета общего числа объектов и без OFFSET.
+    """
+    page_size_query_param = 'limit'
+    ordering = ('pub_date', 'id')
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Порядок сортировки может задаваться вьюсетом.
+        """
+        get_cursor_ordering = getattr(view, 'get_cursor_ordering', None)
+        if get_cursor_ordering is not None:
+            return get_cursor_ordering()
+        return self.ordering
 
 
 class PageNumberPaginationWithLimit(PageNumberPagination):
     """
     Пагинатор с возможность изменения кол-ва выдаваемых на
-    странице объектов
+    странице объектов; по параметру pagination=cursor (или при
+    переданном cursor) переключается на курсорную пагинацию.
+    Общее число объектов считается по стратегии из настроек.
     """
     page_size_query_param = 'limit'
+    django_paginator_class = CountStrategyPaginator
+    cursor_pagination_class = CursorPaginationWithLimit
+    cursor_paginator = None
+
+    def is_cursor_requested(self, request):
+        """
+        Запрошена ли курсорная пагинация.
+        """
+        return (
+            request.query_params.get('pagination') == 'cursor'
+            or 'cursor' in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.is_cursor_requested(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,57 @@
+import json
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import MultiPartParser
+
+from api.validators import get_image_size_error
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Пишет загружаемый файл по частям сразу во временный файл на диске
+    и прерывает загрузку, как только файл превысит допустимый размер.
+    """
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE:
+            self.upload_interrupted()
+            raise serializers.ValidationError(
+                {'image': [get_image_size_error()]}
+            )
+        return super().receive_data_chunk(raw_data, start)
+
+
+class RecipeMultiPartParser(MultiPartParser):
+    """
+    Рецепт в формате multipart/form-data: изображение передается файлом
+    и пишется на диск по частям, не занимая память целиком.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        request.upload_handlers = [
+            LimitedTemporaryFileUploadHandler(request)
+        ]
+        return super().parse(stream, media_type, parser_context)
+
+
+def parse_recipe_form(form):
+    """
+    Приводит данные формы к виду JSON-запроса: теги передаются
+    повторяющимся полем tags, ингредиенты - JSON-строкой в поле
+    ingredients.
+    """
+    data = {key: form.get(key) for key in form}
+    if 'tags' in form:
+        data['tags'] = form.getlist('tags')
+    if 'ingredients' in form:
+        try:
+            data['ingredients'] = json.loads(form['ingredients'])
+        except ValueError as error:
+            raise ParseError(
+                f'Некорректный JSON в поле ingredients: {error}'
+            )
+    return data
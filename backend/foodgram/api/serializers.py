@@ -1,11 +1,21 @@
+from io import BytesIO
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import UploadedFile
 from django.db import transaction
-from drf_extra_fields.fields import Base64ImageField
+from drf_extra_fields.fields import Base64FieldMixin, Base64ImageField
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 
-from api.validators import validate_ingredients, validate_tags
+from api.utils import get_recipes_limit
+from api.validators import (get_image_size_error, validate_ingredients,
+                            validate_recipe_image, validate_tags)
+from recipes.images import (IMAGE_STATE_FIELDS, get_image_storage,
+                            get_image_variants, reload_image_state)
 from recipes.models import (Ingredient, IngredientAmount, Recipe, ShoppingCart,
                             Tag)
+from recipes.utils import rebuild_shopping_lists_for_recipe
 from users.models import Subscription
 
 User = get_user_model()
@@ -37,10 +47,18 @@ class FoodgramUserSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
-        return Subscription.objects.filter(
-            subscriber=request.user,
-            publisher=user_obj.pk
-        ).exists()
+        return user_obj.pk in self.get_subscribed_ids(request.user)
+
+    def get_subscribed_ids(self, user):
+        """
+        Id авторов, на которых подписан пользователь; загружаются один
+        раз на ответ и хранятся в общем контексте сериализаторов.
+        """
+        if 'subscribed_ids' not in self.context:
+            self.context['subscribed_ids'] = set(
+                user.subscriber.values_list('publisher', flat=True)
+            )
+        return self.context['subscribed_ids']
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -85,12 +103,102 @@ class IngredientSerializerWithMeasurement(serializers.ModelSerializer):
         )
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeImageField(Base64ImageField):
+    """
+    Изображение рецепта: base64-строка в JSON или файл в запросе
+    multipart/form-data. Размер и число пикселей проверяются до полного
+    декодирования изображения.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            validate_recipe_image(data)
+            # Файл уже загружен: декодирование base64 не требуется.
+            return super(Base64FieldMixin, self).to_internal_value(data)
+        # Длина base64-строки - 4/3 размера файла.
+        if (
+            isinstance(data, str)
+            and len(data) * 3 // 4 > settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE
+        ):
+            raise serializers.ValidationError(get_image_size_error())
+        return super().to_internal_value(data)
+
+    def get_file_extension(self, filename, decoded_file):
+        validate_recipe_image(UploadedFile(
+            BytesIO(decoded_file), filename, size=len(decoded_file)
+        ))
+        return super().get_file_extension(filename, decoded_file)
+
+
+class RecipeImageVariantsMixin(serializers.Serializer):
+    """
+    Ссылки на уменьшенные копии изображения рецепта и размеры оригинала.
+    Пока копий нет, вместо них отдается оригинал.
+    """
+
+    image_small = serializers.SerializerMethodField()
+    image_medium = serializers.SerializerMethodField()
+    image_width = serializers.SerializerMethodField()
+    image_height = serializers.SerializerMethodField()
+    image_placeholder = serializers.SerializerMethodField()
+
+    def get_variants(self, recipe_obj):
+        """
+        При чтении недостающие копии создаются сразу; ответы на запросы
+        изменения и сериализаторы без запроса в контексте (ответы на
+        добавление в избранное, в список покупок, подписку) их не ждут -
+        копии создаст фоновый обработчик.
+        """
+        request = self.context.get('request')
+        return get_image_variants(
+            recipe_obj,
+            generate=request is not None and request.method in SAFE_METHODS,
+        )
+
+    def get_variant_url(self, recipe_obj, variant):
+        name = self.get_variants(recipe_obj).get(variant, {}).get(
+            settings.RECIPE_IMAGE_SERVED_FORMAT
+        )
+        if name is None:
+            if not recipe_obj.image:
+                return None
+            url = recipe_obj.image.url
+        else:
+            url = get_image_storage().url(name)
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def get_image_small(self, recipe_obj):
+        return self.get_variant_url(recipe_obj, 'small')
+
+    def get_image_medium(self, recipe_obj):
+        return self.get_variant_url(recipe_obj, 'medium')
+
+    def get_image_width(self, recipe_obj):
+        return self.get_variants(recipe_obj).get('original', {}).get('width')
+
+    def get_image_height(self, recipe_obj):
+        return self.get_variants(recipe_obj).get('original', {}).get(
+            'height'
+        )
+
+    def get_image_placeholder(self, recipe_obj):
+        """
+        Крошечное превью (data URI), которое клиент показывает, пока
+        загружается изображение; пустая строка, если превью еще нет.
+        """
+        self.get_variants(recipe_obj)
+        return recipe_obj.image_placeholder
+
+
+class RecipeSerializer(RecipeImageVariantsMixin, serializers.ModelSerializer):
     """
     Сериализатор для модели Recipe (рецепты).
     """
 
-    image = Base64ImageField()
+    image = RecipeImageField()
     tags = TagSerializer(read_only=True, many=True)
     author = FoodgramUserSerializer(read_only=True)
     ingredients = IngredientSerializerWithMeasurement(many=True)
@@ -108,6 +216,11 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_small',
+            'image_medium',
+            'image_width',
+            'image_height',
+            'image_placeholder',
             'text',
             'cooking_time',
         )
@@ -116,6 +229,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         """
         Проверка, есть ли рецепт в списке избранных пользователя.
         """
+        if hasattr(recipe_obj, 'is_favorited'):
+            return recipe_obj.is_favorited
         user = self.context.get('request').user
         return (
             user.is_authenticated
@@ -129,6 +244,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         """
         Проверка, есть ли рецепт в списке покупок пользователя.
         """
+        if hasattr(recipe_obj, 'is_in_shopping_cart'):
+            return recipe_obj.is_in_shopping_cart
         user = self.context.get('request').user
         return (
             user.is_authenticated
@@ -162,19 +279,16 @@ class RecipeSerializer(serializers.ModelSerializer):
         """
         Создает новые ингредиенты (модель IngredientAmount) при
         создании/обновлении рецепта.
+        Существование ингредиентов проверено одним запросом при валидации.
         """
-        new_ingredients = []
-        for ingredient in ingredients:
-            new_ingredients.append(
-                IngredientAmount(
-                    recipe=recipe,
-                    ingredient=Ingredient.objects.get(
-                        pk=ingredient.get('id')
-                    ),
-                    amount=ingredient.get('amount'),
-                )
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(
+                recipe=recipe,
+                ingredient_id=ingredient.get('id'),
+                amount=ingredient.get('amount'),
             )
-        IngredientAmount.objects.bulk_create(new_ingredients)
+            for ingredient in ingredients
+        )
 
     @transaction.atomic
     def create(self, validated_data):
@@ -193,17 +307,83 @@ class RecipeSerializer(serializers.ModelSerializer):
         """
         Обновление рецепта.
         """
-        tags = validated_data.pop('tags')
-        recipe.tags.clear()
-        recipe.tags.set(tags)
-        ingredients = validated_data.pop('ingredients')
-        IngredientAmount.objects.filter(recipe=recipe).delete()
-        self.create_ingredients(ingredients, recipe)
-
-        return super().update(recipe, validated_data)
+        self.update_tags(recipe, validated_data.pop('tags'))
+        if self.update_ingredients(
+            recipe, validated_data.pop('ingredients')
+        ):
+            rebuild_shopping_lists_for_recipe(recipe)
+
+        # Состояние копий изображения сохраняется только вместе с новым
+        # изображением, иначе PATCH затер бы копии, записанные
+        # обработчиком после загрузки рецепта.
+        update_fields = list(validated_data)
+        if 'image' in validated_data:
+            reload_image_state(recipe)
+            update_fields.extend(IMAGE_STATE_FIELDS)
+        for field, value in validated_data.items():
+            setattr(recipe, field, value)
+        recipe.save(update_fields=update_fields)
+        return recipe
 
+    @staticmethod
+    def update_tags(recipe, tags):
+        """
+        Добавляет и удаляет только изменившиеся теги рецепта.
+        """
+        current_tags = set(recipe.tags.values_list('id', flat=True))
+        new_tags = {int(tag) for tag in tags}
+        if new_tags == current_tags:
+            return
+        recipe.tags.remove(*(current_tags - new_tags))
+        recipe.tags.add(*(new_tags - current_tags))
 
-class FavoriteRecipeSerializer(serializers.ModelSerializer):
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        """
+        Сравнивает переданные ингредиенты с текущими и создает,
+        обновляет или удаляет только изменившиеся строки.
+        Возвращает True, если ингредиенты рецепта изменились.
+        """
+        current_amounts = {
+            ingredient_amount.ingredient_id: ingredient_amount
+            for ingredient_amount in IngredientAmount.objects.filter(
+                recipe=recipe
+            )
+        }
+        new_amounts = {
+            int(ingredient.get('id')): int(ingredient.get('amount'))
+            for ingredient in ingredients
+        }
+        deleted_ids = [
+            current_amounts[ingredient_id].pk
+            for ingredient_id in current_amounts.keys() - new_amounts.keys()
+        ]
+        changed_amounts = []
+        for ingredient_id, amount in new_amounts.items():
+            ingredient_amount = current_amounts.get(ingredient_id)
+            if ingredient_amount and ingredient_amount.amount != amount:
+                ingredient_amount.amount = amount
+                changed_amounts.append(ingredient_amount)
+        created_amounts = [
+            IngredientAmount(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=new_amounts[ingredient_id],
+            )
+            for ingredient_id in new_amounts.keys() - current_amounts.keys()
+        ]
+        if deleted_ids:
+            IngredientAmount.objects.filter(pk__in=deleted_ids).delete()
+        if changed_amounts:
+            IngredientAmount.objects.bulk_update(changed_amounts, ['amount'])
+        if created_amounts:
+            IngredientAmount.objects.bulk_create(created_amounts)
+        return bool(deleted_ids or changed_amounts or created_amounts)
+
+
+class FavoriteRecipeSerializer(
+    RecipeImageVariantsMixin, serializers.ModelSerializer
+):
     """
     Сериализатор для добавления/удаления рецепта из списка избранного.
     Также используется для вывода рецептов, на автора которых
@@ -216,6 +396,11 @@ class FavoriteRecipeSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_small',
+            'image_medium',
+            'image_width',
+            'image_height',
+            'image_placeholder',
             'cooking_time',
         )
         read_only_fields = ('__all__', )
@@ -232,7 +417,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     first_name = serializers.ReadOnlyField(source='publisher.first_name')
     last_name = serializers.ReadOnlyField(source='publisher.last_name')
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.ReadOnlyField(source='publisher.recipes.count')
+    recipes_count = serializers.SerializerMethodField()
     is_subscribed = serializers.BooleanField(default=True, read_only=True)
 
     class Meta:
@@ -252,20 +437,25 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         """
         Рецепты автора, на которого подписан пользователь.
         """
-        request = self.context.get('user_request')
-        recipes = obj.publisher.recipes.all()
-        limit_of_objects_on_page = request.query_params.get(
-            'recipes_limit'
-        )
-        if limit_of_objects_on_page:
-            try:
-                limit_of_objects_on_page = abs(int(limit_of_objects_on_page))
-            except ValueError:
-                limit_of_objects_on_page = 0
-            recipes = recipes[:int(limit_of_objects_on_page)]
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            recipes = recipes_by_author[obj.publisher_id]
+        else:
+            recipes = obj.publisher.recipes.all()
+            limit = get_recipes_limit(self.context.get('user_request'))
+            if limit is not None:
+                recipes = recipes[:limit]
         serializer = FavoriteRecipeSerializer(recipes, many=True)
         return serializer.data
 
+    def get_recipes_count(self, obj):
+        """
+        Общее количество рецептов автора.
+        """
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
+        return obj.publisher.recipes.count()
+
 
 class ShoppingCartSerializer(serializers.ModelSerializer):
     """
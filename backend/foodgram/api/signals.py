@@ -0,0 +1,109 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from api.cache import bump_resource_version
+from api.serializers import FoodgramUserSerializer
+from recipes.models import (FavoriteRecipe, Ingredient, IngredientAmount,
+                            Recipe, ShoppingCart, Tag)
+from users.models import Subscription
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=IngredientAmount)
+@receiver(post_delete, sender=IngredientAmount)
+@receiver(post_delete, sender=User)
+def bump_recipes_version(sender, **kwargs):
+    """
+    Сбрасывает кеш ответов и ETag рецептов при изменении данных,
+    которые попадают в эти ответы.
+    """
+    bump_resource_version('recipes')
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipes_version_on_tags_change(sender, action, **kwargs):
+    """
+    Сбрасывает кеш рецептов после изменения их тегов; сигналы pre_*
+    пропускаются, чтобы изменение не сбрасывало кеш дважды.
+    """
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_resource_version('recipes')
+
+
+@receiver(post_save, sender=User)
+def bump_recipes_version_on_author_change(
+    sender, instance, created, update_fields, **kwargs
+):
+    """
+    Сбрасывает кеш рецептов, только если изменились выводимые в них
+    поля автора: вход в систему сохраняет лишь last_login, а у нового
+    пользователя еще нет рецептов.
+    """
+    if created:
+        return
+    if update_fields is not None and not (
+        set(update_fields) & set(FoodgramUserSerializer.Meta.fields)
+    ):
+        return
+    bump_resource_version('recipes')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_tags_version(sender, **kwargs):
+    """
+    Изменение тега затрагивает и теги, и рецепты.
+    """
+    bump_resource_version('tags')
+    bump_resource_version('recipes')
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_ingredients_version(sender, **kwargs):
+    """
+    Изменение ингредиента затрагивает и ингредиенты, и рецепты.
+    """
+    bump_resource_version('ingredients')
+    bump_resource_version('recipes')
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def bump_user_recipes_state(sender, instance, **kwargs):
+    """
+    Избранное и список покупок влияют на флаги рецептов пользователя.
+    """
+    bump_resource_version(f'user:{instance.user_id}')
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def bump_user_subscriptions_state(sender, instance, **kwargs):
+    """
+    Подписки влияют на флаг is_subscribed у авторов рецептов.
+    """
+    bump_resource_version(f'user:{instance.subscriber_id}')
+
+
+@receiver(connection_created)
+def set_trigram_similarity_threshold(sender, connection, **kwargs):
+    """
+    Порог оператора "%>" из pg_trgm для нечеткого поиска ингредиентов
+    берется из настройки INGREDIENT_SEARCH_SIMILARITY_THRESHOLD.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SET pg_trgm.word_similarity_threshold = %s',
+            [settings.INGREDIENT_SEARCH_SIMILARITY_THRESHOLD],
+        )
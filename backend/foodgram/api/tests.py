@@ -0,0 +1,511 @@
+import base64
+import json
+import shutil
+import tempfile
+from collections import Counter
+from io import BytesIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.cache import get_resource_version
+from api.checks import DATABASE_CACHE_BACKEND, check_cache_backend
+from api.ingredient_index import ingredient_index
+from api.serializers import RecipeSerializer
+from api.utils import get_shopping_list
+from recipes.feeds import update_popular_author_ids
+from recipes.images import get_image_variants, get_recipe_file_names
+from recipes.models import (FeedEntry, ImageStatus, Ingredient, Recipe,
+                            StoredFile, Tag)
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+# Кеш по умолчанию (memcached) не обращается к базе данных, как и LocMemCache,
+# поэтому числа запросов в тестах совпадают с рабочими; кеш в базе данных
+# запрещен проверкой api.E001 (см. CacheBackendTest).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+def make_image(color: str = 'red') -> str:
+    buffer = BytesIO()
+    Image.new('RGB', (40, 30), color).save(buffer, 'PNG')
+    return (
+        'data:image/png;base64,'
+        + base64.b64encode(buffer.getvalue()).decode()
+    )
+
+
+class CacheBackendTest(SimpleTestCase):
+    """
+    Настроенный кеш не добавляет запросов к базе данных.
+    """
+
+    def test_configured_backend_is_not_in_database(self):
+        self.assertEqual(check_cache_backend(None), [])
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': DATABASE_CACHE_BACKEND},
+    })
+    def test_database_backend_is_rejected(self):
+        self.assertEqual(
+            [error.id for error in check_cache_backend(None)], ['api.E001']
+        )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=CACHES)
+class RecipeTestCase(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='cook@foodgram.ru',
+            username='cook',
+            first_name='Иван',
+            last_name='Поваров',
+            password='Pass-12345',
+        )
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {i}', slug=f'tag{i}', color='#FF0000'
+            )
+            for i in range(2)
+        ]
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(5)
+        )
+        cls.ingredients = list(Ingredient.objects.order_by('id'))
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def recipe_data(self, name='Рецепт', amounts=(10, 20, 30)):
+        return {
+            'name': name,
+            'text': 'Описание',
+            'cooking_time': 5,
+            'image': make_image(),
+            'tags': [tag.id for tag in self.tags],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': amount}
+                for ingredient, amount in zip(self.ingredients, amounts)
+            ],
+        }
+
+    def create_recipe(self, **kwargs) -> Recipe:
+        response = self.client.post(
+            '/api/recipes/', self.recipe_data(**kwargs), format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return Recipe.objects.get(pk=response.json()['id'])
+
+
+class RecipeQueryCountTest(RecipeTestCase):
+    """
+    Число запросов к базе на операции с рецептами не зависит
+    от числа рецептов, тегов и ингредиентов.
+    """
+
+    def setUp(self):
+        super().setUp()
+        for number in range(6):
+            get_image_variants(self.create_recipe(name=f'Рецепт {number}'))
+        self.recipe = Recipe.objects.first()
+        cache.clear()
+
+    def test_list(self):
+        for limit in (2, 6):
+            cache.clear()
+            with self.subTest(limit=limit), self.assertNumQueries(5):
+                response = self.client.get(f'/api/recipes/?limit={limit}')
+                self.assertEqual(len(response.json()['results']), limit)
+
+    def test_retrieve(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_create(self):
+        for amounts in ((10,), (10, 20, 30, 40, 50)):
+            cache.clear()
+            data = self.recipe_data(
+                name=f'Новый рецепт {len(amounts)}', amounts=amounts
+            )
+            with self.subTest(ingredients=len(amounts)), \
+                    self.assertNumQueries(18):
+                response = self.client.post(
+                    '/api/recipes/', data, format='json'
+                )
+                self.assertEqual(response.status_code, 201, response.content)
+
+    def test_partial_update(self):
+        data = self.recipe_data(name='Новое название', amounts=(15, 25))
+        del data['image']
+        with self.assertNumQueries(18):
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.id}/', data, format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+
+
+class ResponseCacheTest(RecipeTestCase):
+    """
+    Попадание в кеш ответов не обращается к базе и ничего не пишет
+    в кеш; версия рецептов меняется после фиксации транзакции.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.create_recipe()
+        get_image_variants(self.recipe)
+        self.anonymous = APIClient()
+
+    def test_hit_runs_no_queries(self):
+        self.anonymous.get('/api/recipes/')
+        with self.assertNumQueries(0):
+            response = self.anonymous.get('/api/recipes/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_hit_does_not_write_cache(self):
+        self.anonymous.get('/api/recipes/')
+        with mock.patch.object(cache, 'set') as cache_set, \
+                mock.patch.object(cache, 'add') as cache_add:
+            self.anonymous.get('/api/recipes/')
+        cache_set.assert_not_called()
+        cache_add.assert_not_called()
+
+    def test_change_bumps_version_on_commit(self):
+        etag = self.anonymous.get('/api/recipes/')['ETag']
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.recipe.name = 'Новое название'
+            self.recipe.save()
+        self.assertEqual(self.anonymous.get('/api/recipes/')['ETag'], etag)
+        for callback in callbacks:
+            callback()
+        response = self.anonymous.get('/api/recipes/')
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_create_bumps_version_once_per_change(self):
+        with mock.patch('api.signals.bump_resource_version') as bump:
+            self.create_recipe(name='Новый рецепт', amounts=(10,))
+        # Сохранение рецепта и добавление тегов (post_add, без pre_add).
+        self.assertEqual(
+            [call.args for call in bump.call_args_list
+             if call.args == ('recipes',)],
+            [('recipes',)] * 2,
+        )
+
+
+class ShoppingListTest(RecipeTestCase):
+    """
+    Список покупок складывает количества одного ингредиента
+    из всех рецептов корзины.
+    """
+
+    def download(self):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/?format=json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_equal_amounts_are_summed(self):
+        for name in ('Суп', 'Каша'):
+            recipe = self.create_recipe(name=name, amounts=(200,))
+            response = self.client.post(
+                f'/api/recipes/{recipe.id}/shopping_cart/'
+            )
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            list(get_shopping_list(self.user)),
+            [{
+                'name': self.ingredients[0].name,
+                'measurement_unit': 'г',
+                'amount': 400,
+            }],
+        )
+        self.assertEqual(self.download()['ingredients'][0]['amount'], 400)
+        self.client.delete(f'/api/recipes/{recipe.id}/shopping_cart/')
+        self.assertEqual(self.download()['ingredients'][0]['amount'], 200)
+
+    def test_emptied_cart_has_no_items(self):
+        recipe = self.create_recipe(amounts=(200, 100))
+        self.client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        self.client.delete(f'/api/recipes/{recipe.id}/shopping_cart/')
+        self.assertFalse(get_shopping_list(self.user).exists())
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 400)
+
+
+class IngredientSearchTest(RecipeTestCase):
+    """
+    Поиск ингредиентов: автодополнение по началу названия из индекса
+    в памяти.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in (
+                'сахар',
+                'сахарная пудра',
+                'коричневый сахар',
+                'соль',
+                'масло сливочное',
+            )
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.anonymous = APIClient()
+
+    def search(self, **params):
+        response = self.anonymous.get('/api/ingredients/', params)
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def test_autocomplete_does_not_query_database(self):
+        ingredient_index.warm_up()
+        with self.assertNumQueries(0):
+            names = self.search(name='ингредиент 1')
+        self.assertEqual(names, ['Ингредиент 1'])
+
+    def test_autocomplete_reads_version_once(self):
+        self.search(name='инг')
+        with mock.patch(
+            'api.cache.get_resource_version',
+            wraps=get_resource_version,
+        ) as get_version:
+            self.search(name='инг')
+        get_version.assert_called_once_with('ingredients')
+
+    def test_fuzzy_search_ranks_prefix_matches_first(self):
+        self.assertEqual(
+            self.search(search='сахар'),
+            ['сахар', 'сахарная пудра', 'коричневый сахар'],
+        )
+
+    def test_fuzzy_search_keeps_short_prefix_matches(self):
+        self.assertEqual(
+            self.search(search='с'), ['соль', 'сахар', 'сахарная пудра']
+        )
+
+    def test_fuzzy_search_finds_typos_and_words_inside_name(self):
+        self.assertEqual(self.search(search='сахр')[0], 'сахар')
+        with override_settings(INGREDIENT_SEARCH_SIMILARITY_THRESHOLD=0.9):
+            self.assertEqual(self.search(search='сахр'), [])
+        self.assertEqual(
+            self.search(search='сливочное'), ['масло сливочное']
+        )
+
+
+class ImageVariantsTest(RecipeTestCase):
+    """
+    Ответы на запросы изменения не ждут создания копий изображения.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.create_recipe()
+        self.reader = User.objects.create_user(
+            email='reader@foodgram.ru',
+            username='reader',
+            first_name='Петр',
+            last_name='Читателев',
+            password='Pass-12345',
+        )
+        self.client.force_authenticate(self.reader)
+
+    def test_write_responses_do_not_resize_images(self):
+        with mock.patch('recipes.images.make_image_variants') as make:
+            for url in (
+                f'/api/recipes/{self.recipe.id}/favorite/',
+                f'/api/recipes/{self.recipe.id}/shopping_cart/',
+                f'/api/users/{self.user.id}/subscribe/',
+            ):
+                with self.subTest(url=url):
+                    response = self.client.post(url)
+                    self.assertEqual(response.status_code, 201)
+        make.assert_not_called()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, ImageStatus.PENDING)
+
+    def test_read_creates_missing_variants(self):
+        response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, ImageStatus.READY)
+
+    def update_stale_recipe(self, **data):
+        """
+        Изменяет рецепт, загруженный до того, как обработчик
+        сохранил копии изображения.
+        """
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        variants = get_image_variants(Recipe.objects.get(pk=self.recipe.pk))
+        data.update(
+            tags=[tag.id for tag in self.tags],
+            ingredients=[{'id': self.ingredients[0].id, 'amount': 10}],
+        )
+        serializer = RecipeSerializer(
+            stale,
+            data=data,
+            partial=True,
+            context={'request': mock.Mock(user=self.user, method='PATCH')},
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.recipe.refresh_from_db()
+        return get_recipe_file_names(None, variants)
+
+    def references(self, names):
+        return dict(
+            StoredFile.objects.filter(name__in=names).values_list(
+                'name', 'references'
+            )
+        )
+
+    def test_update_keeps_variants_saved_meanwhile(self):
+        variant_files = self.update_stale_recipe(name='Новое название')
+        self.assertEqual(self.recipe.name, 'Новое название')
+        self.assertEqual(self.recipe.image_status, ImageStatus.READY)
+        self.assertEqual(
+            get_recipe_file_names(None, self.recipe.image_variants),
+            variant_files,
+        )
+        # Копии маленького изображения совпадают и хранятся одним файлом.
+        self.assertEqual(
+            self.references(variant_files), Counter(variant_files)
+        )
+
+    def test_new_image_releases_variants_saved_meanwhile(self):
+        variant_files = self.update_stale_recipe(image=make_image('blue'))
+        self.assertEqual(self.recipe.image_status, ImageStatus.PENDING)
+        self.assertEqual(self.recipe.image_variants, {})
+        self.assertEqual(
+            self.references(variant_files),
+            dict.fromkeys(variant_files, 0),
+        )
+
+
+class FeedTest(RecipeTestCase):
+    """
+    Лента рецептов подписок: рассылка при публикации, дозаполнение
+    при подписке и чтение рецептов популярных авторов при запросе.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.reader = User.objects.create_user(
+            email='reader@foodgram.ru',
+            username='reader',
+            first_name='Петр',
+            last_name='Читателев',
+            password='Pass-12345',
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.reader_client = APIClient()
+        self.reader_client.force_authenticate(self.reader)
+
+    def subscribe(self):
+        response = self.reader_client.post(
+            f'/api/users/{self.user.id}/subscribe/'
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def create_recipes(self, count):
+        return [
+            self.create_recipe(name=f'Рецепт {number}')
+            for number in range(count)
+        ]
+
+    def read_feed(self, url='/api/recipes/feed/'):
+        response = self.reader_client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def feed_names(self):
+        return [recipe['name'] for recipe in self.read_feed()['results']]
+
+    def test_new_recipes_are_fanned_out_newest_first(self):
+        self.subscribe()
+        self.create_recipes(3)
+        self.assertEqual(
+            FeedEntry.objects.filter(subscriber=self.reader).count(), 3
+        )
+        self.assertEqual(
+            self.feed_names(), ['Рецепт 2', 'Рецепт 1', 'Рецепт 0']
+        )
+
+    def test_cursor_pages_cover_feed_once(self):
+        self.subscribe()
+        self.create_recipes(5)
+        names, url = [], '/api/recipes/feed/?limit=2'
+        while url:
+            page = self.read_feed(url)
+            self.assertLessEqual(len(page['results']), 2)
+            names.extend(recipe['name'] for recipe in page['results'])
+            url = page['next']
+        self.assertEqual(
+            names, [f'Рецепт {number}' for number in range(4, -1, -1)]
+        )
+
+    @override_settings(FEED_BACKFILL_LIMIT=2)
+    def test_subscribe_backfills_latest_recipes(self):
+        self.create_recipes(3)
+        self.subscribe()
+        self.assertEqual(self.feed_names(), ['Рецепт 2', 'Рецепт 1'])
+
+    def test_unsubscribe_removes_author_recipes(self):
+        self.subscribe()
+        self.create_recipes(2)
+        response = self.reader_client.delete(
+            f'/api/users/{self.user.id}/subscribe/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(
+            FeedEntry.objects.filter(subscriber=self.reader).exists()
+        )
+        self.assertEqual(self.feed_names(), [])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=0)
+    def test_popular_author_recipes_are_read_at_request_time(self):
+        self.subscribe()
+        self.create_recipes(2)
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(self.feed_names(), ['Рецепт 1', 'Рецепт 0'])
+
+    def test_demoted_author_is_backfilled(self):
+        with override_settings(FEED_FANOUT_MAX_FOLLOWERS=0):
+            self.subscribe()
+            self.create_recipes(2)
+            self.assertEqual(
+                update_popular_author_ids(), ({self.user.id}, set())
+            )
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(
+            update_popular_author_ids(), (set(), {self.user.id})
+        )
+        self.assertEqual(
+            FeedEntry.objects.filter(subscriber=self.reader).count(), 2
+        )
+        self.assertEqual(self.feed_names(), ['Рецепт 1', 'Рецепт 0'])
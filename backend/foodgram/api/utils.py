@@ -1,6 +1,13 @@
+import time
+from collections import defaultdict
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from rest_framework import status
 from rest_framework.response import Response
 
+from recipes.models import Recipe
+
 
 def create_request_obj(request_obj,
                        model_class,
@@ -44,3 +51,73 @@ def delete_request_obj(model_class,
         {'detail': messages.get('delete_success')},
         status=status.HTTP_204_NO_CONTENT,
     )
+
+
+def get_recipes_limit(request):
+    """
+    Значение параметра recipes_limit из запроса; None, если
+    ограничение не задано.
+    """
+    recipes_limit = request.query_params.get('recipes_limit')
+    if not recipes_limit:
+        return None
+    try:
+        return abs(int(recipes_limit))
+    except ValueError:
+        return 0
+
+
+def get_recipes_by_author(author_ids, limit=None):
+    """
+    Рецепты нескольких авторов одним запросом, сгруппированные по
+    id автора; при заданном limit для каждого автора выбираются
+    первые limit рецептов с помощью оконной функции ROW_NUMBER().
+    """
+    recipes_by_author = defaultdict(list)
+    if limit == 0:
+        return recipes_by_author
+    recipes = Recipe.objects.filter(author__in=author_ids)
+    if limit is not None:
+        ranked_sql, params = recipes.annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=[F('author_id')],
+                order_by=[F('pub_date').asc(), F('id').asc()],
+            )
+        ).order_by().query.sql_with_params()
+        recipes = Recipe.objects.raw(
+            f'SELECT * FROM ({ranked_sql}) ranked_recipes '
+            'WHERE row_number <= %s ORDER BY author_id, row_number',
+            (*params, limit),
+        )
+    for recipe in recipes:
+        recipes_by_author[recipe.author_id].append(recipe)
+    return recipes_by_author
+
+
+def get_shopping_list(user):
+    """
+    Список покупок пользователя - одно индексированное чтение из
+    поддерживаемой таблицы итогов ShoppingListItem; строки упорядочены
+    по названию. Пустой набор - корзина пуста.
+    """
+    return user.shopping_list_items.filter(
+        total_amount__gt=0,
+    ).values(
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit'),
+        amount=F('total_amount'),
+    ).order_by('name', 'measurement_unit')
+
+
+def measure(function, repeat):
+    """
+    Лучшее время выполнения функции из нескольких повторов, мс;
+    используется командами замера производительности.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
@@ -1,6 +1,9 @@
+from django.conf import settings
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
 from rest_framework import serializers
 
-from recipes.models import Tag
+from recipes.models import Ingredient, Tag
 
 
 def validate_tags(tags_ids=None):
@@ -15,13 +18,17 @@ def validate_tags(tags_ids=None):
         raise serializers.ValidationError(
             'Теги не должны повторяться!'
         )
-    for tag in tags_ids:
-        try:
-            Tag.objects.get(id=tag)
-        except Tag.DoesNotExist:
-            raise serializers.ValidationError(
-                f'Тега с id {tag} не существует!'
-            )
+    existing_tags_ids = set(
+        Tag.objects.filter(id__in=tags_ids).values_list('id', flat=True)
+    )
+    missing_tags_ids = [
+        tag for tag in tags_ids if int(tag) not in existing_tags_ids
+    ]
+    if missing_tags_ids:
+        raise serializers.ValidationError(
+            'Тегов с id '
+            f'{", ".join(map(str, missing_tags_ids))} не существует!'
+        )
 
 
 def validate_ingredients(ingredients=None):
@@ -37,6 +44,20 @@ def validate_ingredients(ingredients=None):
         raise serializers.ValidationError(
             'Ингридиенты должны иметь уникальный id!'
         )
+    existing_ingredients_ids = set(
+        Ingredient.objects.filter(
+            id__in=ingredients_ids
+        ).values_list('id', flat=True)
+    )
+    missing_ingredients_ids = [
+        ingredient_id for ingredient_id in ingredients_ids
+        if int(ingredient_id) not in existing_ingredients_ids
+    ]
+    if missing_ingredients_ids:
+        raise serializers.ValidationError(
+            'Ингредиентов с id '
+            f'{", ".join(map(str, missing_ingredients_ids))} не существует!'
+        )
     amount_of_ingredients = [
         ingredient.get('amount') for ingredient in ingredients
     ]
@@ -44,3 +65,33 @@ def validate_ingredients(ingredients=None):
         raise serializers.ValidationError(
             'Минимальное количество ингридиента = 1!'
         )
+
+
+def get_image_size_error():
+    return (
+        'Размер изображения не должен превышать '
+        f'{filesizeformat(settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE)}!'
+    )
+
+
+def validate_recipe_image(image_file):
+    """
+    Проверяет размер файла и по заголовку - число пикселей изображения,
+    до его полного декодирования (защита от «бомб распаковки»).
+    """
+    if image_file.size > settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE:
+        raise serializers.ValidationError(get_image_size_error())
+    try:
+        with Image.open(image_file) as image:
+            width, height = image.size
+    except (OSError, Image.DecompressionBombError):
+        raise serializers.ValidationError(
+            'Загрузите корректное изображение!'
+        )
+    finally:
+        image_file.seek(0)
+    if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+        raise serializers.ValidationError(
+            f'Изображение {width}x{height} слишком большое: допускается '
+            f'не более {settings.RECIPE_IMAGE_MAX_PIXELS} пикселей!'
+        )
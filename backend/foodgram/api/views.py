@@ -1,29 +1,44 @@
 from datetime import datetime
+from itertools import chain
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.shortcuts import HttpResponse, get_object_or_404
+from django.db.models import Count, Exists, OuterRef, Prefetch
+from django.http import QueryDict, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.serializers import UserCreateSerializer
 from djoser.views import UserViewSet
 
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.permissions import (AllowAny, IsAdminUser,
+                                        IsAuthenticated)
 from rest_framework.response import Response
 
 
+from api.cache import (cache_anonymous_response, conditional_response,
+                       get_request_resource_version, get_response_cache_stats)
+from api.exporters import ExportFormatNegotiation, get_exporter
 from api.filters import IngredientSearchFilter, RecipesFilter
-from api.paginators import PageNumberPaginationWithLimit
+from api.importers import RecipeImporter, iter_recipe_records
+from api.ingredient_index import ingredient_index
+from api.paginators import (CursorPaginationWithLimit,
+                            PageNumberPaginationWithLimit)
+from api.parsers import RecipeMultiPartParser, parse_recipe_form
 from api.permissions import IsAuthorOrAdminOrReadOnly
 from api.serializers import (FavoriteRecipeSerializer, FoodgramUserSerializer,
                              IngredientSerializer, RecipeSerializer,
                              ShoppingCartSerializer, SubscriptionSerializer,
                              TagSerializer)
-from api.utils import create_request_obj, delete_request_obj
+from api.utils import (create_request_obj, delete_request_obj,
+                       get_recipes_by_author, get_recipes_limit,
+                       get_shopping_list)
 from recipes.models import (FavoriteRecipe, Ingredient, IngredientAmount,
                             Recipe, ShoppingCart, Tag)
+from recipes.feeds import get_feed
+from recipes.units import normalize_shopping_list
 from users.models import Subscription
 
 User = get_user_model()
@@ -62,6 +77,14 @@ class FoodgramUserViewSet(viewsets.ModelViewSet):
             permission_classes = [IsAuthorOrAdminOrReadOnly]
         return [permission() for permission in permission_classes]
 
+    def get_cursor_ordering(self):
+        """
+        Ключ сортировки для курсорной пагинации.
+        """
+        if self.action == 'subscriptions':
+            return ('publisher_id', 'id')
+        return ('username', 'id')
+
     @action(
         ['GET'],
         detail=False,
@@ -71,11 +94,21 @@ class FoodgramUserViewSet(viewsets.ModelViewSet):
         """
         Возвращает всех авторов, чьим подписчиком является пользователь.
         """
-        publishers = request.user.subscriber.all()
+        publishers = self.paginate_queryset(
+            request.user.subscriber.select_related('publisher').annotate(
+                recipes_count=Count('publisher__recipes'),
+            ).order_by('publisher')
+        )
         serializer = SubscriptionSerializer(
-            self.paginate_queryset(publishers),
+            publishers,
             many=True,
-            context={'user_request': request}
+            context={
+                'user_request': request,
+                'recipes_by_author': get_recipes_by_author(
+                    [subscription.publisher_id for subscription in publishers],
+                    limit=get_recipes_limit(request),
+                ),
+            }
         )
         return self.get_paginated_response(serializer.data)
 
@@ -136,6 +169,14 @@ class TagViewSet(mixins.ListModelMixin,
     pagination_class = None
     permission_classes = (AllowAny, )
 
+    @conditional_response('tags')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response('tags')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class IngredientViewSet(mixins.ListModelMixin,
                         mixins.RetrieveModelMixin,
@@ -151,6 +192,24 @@ class IngredientViewSet(mixins.ListModelMixin,
     filter_backends = (DjangoFilterBackend, )
     filterset_class = IngredientSearchFilter
 
+    @conditional_response('ingredients')
+    def list(self, request, *args, **kwargs):
+        """
+        Поиск по началу названия обслуживается индексом в памяти.
+        """
+        name = request.query_params.get('name')
+        if name is None or 'search' in request.query_params:
+            return super().list(request, *args, **kwargs)
+        return Response(
+            ingredient_index.search(
+                name, get_request_resource_version(request, 'ingredients')
+            )
+        )
+
+    @conditional_response('ingredients')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class RecipeViewset(viewsets.ModelViewSet):
     """
@@ -162,9 +221,155 @@ class RecipeViewset(viewsets.ModelViewSet):
     serializer_class = RecipeSerializer
     pagination_class = PageNumberPaginationWithLimit
     permission_classes = (IsAuthorOrAdminOrReadOnly, )
+    parser_classes = (JSONParser, RecipeMultiPartParser)
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipesFilter
 
+    @conditional_response('recipes', per_user=True)
+    @cache_anonymous_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response('recipes', per_user=True)
+    @cache_anonymous_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def get_serializer(self, *args, **kwargs):
+        """
+        Рецепт из multipart/form-data приводится к виду JSON-запроса.
+        """
+        if isinstance(kwargs.get('data'), QueryDict):
+            kwargs['data'] = parse_recipe_form(kwargs['data'])
+        return super().get_serializer(*args, **kwargs)
+
+    @action(
+        methods=['POST'],
+        detail=False,
+        permission_classes=(IsAdminUser, ),
+        parser_classes=(MultiPartParser, ),
+        url_path='import',
+    )
+    def import_recipes(self, request):
+        """
+        Массовый импорт рецептов из файла (поле file) в формате
+        JSON-массива или NDJSON; автор рецептов - администратор.
+        """
+        recipes_file = request.FILES.get('file')
+        if recipes_file is None:
+            return Response(
+                {'errors': 'Не передан файл с рецептами!'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        report = RecipeImporter(author=request.user).run(
+            iter_recipe_records(recipes_file)
+        )
+        return Response(report, status=status.HTTP_200_OK)
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        permission_classes=(IsAdminUser, ),
+    )
+    def cache_stats(self, request):
+        """
+        Счетчики попаданий/промахов кеша ответов для анонимных запросов.
+        """
+        return Response(get_response_cache_stats())
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        permission_classes=(IsAuthenticated, ),
+        pagination_class=CursorPaginationWithLimit,
+    )
+    def feed(self, request):
+        """
+        Лента рецептов авторов, на которых подписан пользователь,
+        от новых к старым; страницы выбираются курсором.
+        """
+        queryset = self.with_user_flags(
+            self.with_related_objects(get_feed(request.user))
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def get_cursor_ordering(self):
+        """
+        Ключ сортировки для курсорной пагинации (совпадает с
+        сортировкой модели Recipe, лента - от новых к старым).
+        """
+        if self.action == 'feed':
+            return ('-feed_pub_date', '-id')
+        return ('pub_date', 'id')
+
+    def get_queryset(self):
+        """
+        Набор рецептов с планом загрузки, выбранным по действию вьюсета.
+        """
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = self.with_related_objects(queryset)
+        return self.with_user_flags(queryset)
+
+    @staticmethod
+    def with_related_objects(queryset):
+        """
+        Заранее загружает автора, теги и ингредиенты рецептов, чтобы
+        сериализация страницы выполнялась фиксированным числом запросов.
+        """
+        return queryset.select_related('author').prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.all()),
+            Prefetch(
+                'ingredients',
+                queryset=IngredientAmount.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        )
+
+    def with_user_flags(self, queryset):
+        """
+        Помечает рецепты флагами is_favorited/is_in_shopping_cart
+        коррелированными подзапросами, чтобы страница рецептов
+        не требовала отдельных запросов на каждый рецепт.
+        """
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset
+        return queryset.annotate(
+            is_favorited=Exists(
+                FavoriteRecipe.objects.filter(
+                    user=user,
+                    recipe=OuterRef('pk'),
+                )
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(
+                    user=user,
+                    recipe=OuterRef('pk'),
+                )
+            ),
+        )
+
+    def reload_for_response(self, serializer):
+        """
+        Перечитывает сохраненный рецепт по плану загрузки для чтения,
+        чтобы ответ на запись не подгружал связи по одной.
+        """
+        serializer.instance = self.with_user_flags(
+            self.with_related_objects(Recipe.objects.all())
+        ).get(pk=serializer.instance.pk)
+
+    def perform_create(self, serializer):
+        serializer.save()
+        self.reload_for_response(serializer)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        self.reload_for_response(serializer)
+
     @action(methods=['POST', 'DELETE'], detail=True)
     def favorite(self, request, pk):
         """
@@ -215,59 +420,42 @@ class RecipeViewset(viewsets.ModelViewSet):
                 messages=settings.SHOPPING_CART_MESSAGES,
             )
 
-    @action(methods=['GET'], detail=False)
+    @action(
+        methods=['GET'],
+        detail=False,
+        permission_classes=(IsAuthenticated, ),
+        content_negotiation_class=ExportFormatNegotiation,
+    )
     def download_shopping_cart(self, request):
         """
-        Скачивание списка покупок файлом в формате ".txt".
+        Скачивание списка покупок файлом; формат задается параметром
+        format (txt, csv, json, pdf), по умолчанию ".txt".
         """
-
-        current_user = User.objects.get(pk=self.request.user.pk)
-        if not current_user.shopping_recipe.exists():
+        exporter_class = get_exporter(
+            request.query_params.get('format', 'txt')
+        )
+        if exporter_class is None:
             return Response(
-                {'errors': 'Ваш список покупок пуст!'},
+                {'errors': 'Неизвестный формат списка покупок!'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        else:
-            shopping_recipes = Recipe.objects.filter(
-                pk__in=[
-                    ShoppingCart.objects.filter(
-                        user=self.request.user.pk
-                    ).values_list('recipe', flat=True)
-                ]
-            ).values_list('pk', flat=True)
-            shopping_ingredients = IngredientAmount.objects.filter(
-                recipe__in=shopping_recipes,
-            ).values(
-                'ingredient__name',
-                'ingredient__measurement_unit',
-            ).annotate(
-                Sum('amount', distinct=True)
-            )
-
-            date_of_loading = datetime.now().strftime("%d.%m.%Y (%H:%M)")
-            new_shopping_list = []
-            new_shopping_list.append('Пользователь: ' + current_user.username)
-            new_shopping_list_name = (
-                f'Список покупок на {date_of_loading}'
+        shopping_ingredients = get_shopping_list(request.user).iterator()
+        first_ingredient = next(shopping_ingredients, None)
+        if first_ingredient is None:
+            return Response(
+                {'errors': 'Ваш список покупок пуст!'},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-            new_shopping_list.append(new_shopping_list_name)
-            new_shopping_list.append('-' * len(new_shopping_list_name) + '\n')
-            for ingredient in shopping_ingredients:
-                new_shopping_list.append(
-                    (
-                        f'* {ingredient.get("ingredient__name")} '
-                        f'({ingredient.get("ingredient__measurement_unit")})'
-                        + f' - {ingredient.get("amount__sum")}'
-                    )
+        exporter = exporter_class(request.user.username, datetime.now())
+        response = StreamingHttpResponse(
+            exporter.export(
+                normalize_shopping_list(
+                    chain([first_ingredient], shopping_ingredients)
                 )
-            new_shopping_list.append(
-                f'\nсервис "Продуктовый помощник" {datetime.now().year} г.'
-            )
-            response = HttpResponse(
-                content='\n'.join(new_shopping_list),
-                content_type='text/plain; charset=UTF-8',
-            )
-            response['Content-Disposition'] = (
-                f'attachment; filename=Shopping_List({date_of_loading}).txt'
-            )
-            return response
+            ),
+            content_type=exporter.content_type,
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{exporter.get_filename()}"'
+        )
+        return response
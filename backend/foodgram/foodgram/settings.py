@@ -85,6 +85,21 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        # Resource versions of the response cache and ETags live in the cache,
+        # so it must be shared by the web and worker processes; it must not be
+        # kept in the application database (see the api.E001 check)
+        'BACKEND': os.getenv('CACHE_BACKEND', default='django.core.cache.backends.memcached.PyMemcacheCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='memcached:11211'),
+        # Without memcached requests are served uncached instead of failing
+        'OPTIONS': {'ignore_exc': True, 'no_delay': True},
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -148,6 +163,24 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 5,
 }
 
+# Pagination count settings ('exact', 'cached' or 'estimated')
+PAGINATION_COUNT_STRATEGY = os.getenv(
+    'PAGINATION_COUNT_STRATEGY', default='exact'
+)
+PAGINATION_COUNT_CACHE_TIMEOUT: int = 60
+PAGINATION_COUNT_ESTIMATE_THRESHOLD: int = 10000
+
+# Fuzzy ingredient search settings
+INGREDIENT_SEARCH_LIMIT: int = 20
+INGREDIENT_SEARCH_SIMILARITY_THRESHOLD: float = 0.6
+
+# Lifetime of cached anonymous responses for recipes (in seconds)
+RECIPES_RESPONSE_CACHE_TIMEOUT: int = 300
+
+# Hits and misses of the response cache are counted in process and added
+# to the shared counters once per this many events
+RESPONSE_CACHE_STATS_FLUSH_EVERY: int = 100
+
 # Djoser settings
 DJOSER = {
     'LOGIN_FIELD': 'email',
@@ -181,5 +214,64 @@ SUBSCRIBE_MESSAGES = {
     'delete_success': 'Подписка успешно отменена!',
 }
 
+# Number of recipes validated and saved in one transaction during import
+RECIPES_IMPORT_BATCH_SIZE: int = 500
+
+# TrueType font with cyrillic glyphs for shopping lists in PDF
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT', default='DejaVuSans.ttf'
+)
+
 # Path to datafiles to load into DB
 DEFAULT_DATA_FILE_PATH = os.path.join(BASE_DIR, 'recipes/default_data/')
+
+# Number of rows written in one query when loading default data
+DEFAULT_DATA_BATCH_SIZE: int = 1000
+
+# Widths of resized recipe images: card thumbnail, detail page, retina
+RECIPE_IMAGE_VARIANTS: dict = {
+    'small': 320,
+    'medium': 640,
+    'large': 1280,
+}
+
+# Formats of resized recipe images and their encoder options
+RECIPE_IMAGE_FORMATS: dict = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 85, 'optimize': True},
+}
+
+# Worker processes used to resize recipe images
+RECIPE_IMAGE_WORKERS: int = int(os.getenv('RECIPE_IMAGE_WORKERS', default=2))
+
+# Format of resized recipe images returned by the API
+RECIPE_IMAGE_SERVED_FORMAT: str = 'webp'
+
+# Seconds an unreferenced image file is kept before garbage collection
+RECIPE_IMAGE_GC_GRACE_PERIOD: int = 60 * 60
+
+# Maximum size of an uploaded recipe image in bytes
+RECIPE_IMAGE_MAX_UPLOAD_SIZE: int = int(
+    os.getenv('RECIPE_IMAGE_MAX_UPLOAD_SIZE', default=10 * 2 ** 20)
+)
+
+# Maximum number of pixels of a recipe image, checked before decoding
+RECIPE_IMAGE_MAX_PIXELS: int = 40_000_000
+
+# Size and encoder options of the inline recipe image placeholder
+RECIPE_IMAGE_PLACEHOLDER_SIZE: int = 16
+RECIPE_IMAGE_PLACEHOLDER_FORMAT: dict = {'format': 'WEBP', 'quality': 40}
+
+# Authors with more followers are not fanned out to feeds on publish;
+# their recipes are merged into the feed at read time
+FEED_FANOUT_MAX_FOLLOWERS: int = 1000
+
+# Number of feed entries inserted per query when fanning out
+FEED_FANOUT_BATCH_SIZE: int = 1000
+
+# Seconds between recomputations of the set of such popular authors
+# by the update_popular_authors worker
+FEED_POPULAR_AUTHORS_REFRESH_INTERVAL: int = 300
+
+# Number of an author's latest recipes added to the feed on subscribe
+FEED_BACKFILL_LIMIT: int = 50
@@ -2,6 +2,7 @@ from django.contrib import admin
 
 from .models import (FavoriteRecipe, Ingredient, IngredientAmount, Recipe,
                      ShoppingCart, Tag)
+from .utils import rebuild_shopping_lists_for_recipe
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -42,6 +43,14 @@ class RecipeAdmin(admin.ModelAdmin):
 
     in_favorite_list.short_description = 'Число добавления в избранное'
 
+    def save_related(self, request, form, formsets, change):
+        """
+        После изменения ингредиентов пересчитывает списки покупок.
+        """
+        super().save_related(request, form, formsets, change)
+        if change:
+            rebuild_shopping_lists_for_recipe(form.instance)
+
 
 class ShoppingCartAdmin(admin.ModelAdmin):
     """
@@ -0,0 +1,196 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Exists, F, OuterRef, Q
+
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscription
+
+POPULAR_AUTHORS_CACHE_KEY = 'feed:popular_authors'
+# Набор популярных авторов при прошлом пересчете командой
+# update_popular_authors; запросы его не меняют.
+PREVIOUS_POPULAR_AUTHORS_CACHE_KEY = 'feed:popular_authors:previous'
+
+
+def count_popular_author_ids() -> frozenset:
+    """
+    Авторы, у которых подписчиков больше FEED_FANOUT_MAX_FOLLOWERS.
+    """
+    return frozenset(
+        Subscription.objects.values('publisher').annotate(
+            followers=Count('id'),
+        ).filter(
+            followers__gt=settings.FEED_FANOUT_MAX_FOLLOWERS,
+        ).values_list('publisher', flat=True)
+    )
+
+
+def get_popular_author_ids() -> frozenset:
+    """
+    Популярные авторы: их рецепты не рассылаются по лентам, а читаются
+    при запросе ленты. Набор пересчитывает команда update_popular_authors;
+    если в кеше его нет, запрос считает его сам (без дозаполнения лент).
+    """
+    popular_ids = cache.get(POPULAR_AUTHORS_CACHE_KEY)
+    if popular_ids is None:
+        popular_ids = count_popular_author_ids()
+        cache.set(
+            POPULAR_AUTHORS_CACHE_KEY,
+            popular_ids,
+            settings.FEED_POPULAR_AUTHORS_REFRESH_INTERVAL,
+        )
+    return popular_ids
+
+
+def update_popular_author_ids():
+    """
+    Пересчитывает популярных авторов и дозаполняет ленты подписчиков
+    тех, кто перестал быть популярным. Возвращает новый набор
+    популярных авторов и набор переставших быть популярными.
+    """
+    popular_ids = count_popular_author_ids()
+    previous_ids = cache.get(PREVIOUS_POPULAR_AUTHORS_CACHE_KEY)
+    if previous_ids is None:
+        previous_ids = cache.get(POPULAR_AUTHORS_CACHE_KEY, frozenset())
+    cache.set_many(
+        {
+            POPULAR_AUTHORS_CACHE_KEY: popular_ids,
+            PREVIOUS_POPULAR_AUTHORS_CACHE_KEY: popular_ids,
+        },
+        None,
+    )
+    demoted_ids = previous_ids - popular_ids
+    for author_id in demoted_ids:
+        add_author_to_feeds(author_id)
+    return popular_ids, demoted_ids
+
+
+def get_latest_recipes(author_id):
+    """
+    Последние FEED_BACKFILL_LIMIT рецептов автора: (id, pub_date).
+    """
+    return list(
+        Recipe.objects.filter(
+            author_id=author_id,
+        ).order_by(
+            '-pub_date', '-id',
+        ).values_list(
+            'id', 'pub_date',
+        )[:settings.FEED_BACKFILL_LIMIT]
+    )
+
+
+def push_recipes_to_feeds(recipes):
+    """
+    Рассылает новые рецепты в ленты подписчиков их авторов
+    (fan-out on write); рецепты популярных авторов пропускаются.
+    """
+    popular_ids = get_popular_author_ids()
+    recipes = [
+        recipe for recipe in recipes if recipe.author_id not in popular_ids
+    ]
+    subscribers = {}
+    for recipe in recipes:
+        if recipe.author_id not in subscribers:
+            subscribers[recipe.author_id] = list(
+                Subscription.objects.filter(
+                    publisher_id=recipe.author_id,
+                ).values_list('subscriber_id', flat=True)
+            )
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                subscriber_id=subscriber_id,
+                recipe_id=recipe.pk,
+                pub_date=recipe.pub_date,
+            )
+            for recipe in recipes
+            for subscriber_id in subscribers[recipe.author_id]
+        ),
+        batch_size=settings.FEED_FANOUT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def add_author_to_feed(subscriber_id, author_id):
+    """
+    После подписки добавляет в ленту последние рецепты автора.
+    """
+    if author_id in get_popular_author_ids():
+        return
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                subscriber_id=subscriber_id,
+                recipe_id=recipe_id,
+                pub_date=pub_date,
+            )
+            for recipe_id, pub_date in get_latest_recipes(author_id)
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def add_author_to_feeds(author_id):
+    """
+    Добавляет последние рецепты автора в ленты всех его подписчиков
+    пакетной вставкой, без запросов на каждого подписчика.
+    """
+    recipes = get_latest_recipes(author_id)
+    if not recipes:
+        return
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                subscriber_id=subscriber_id,
+                recipe_id=recipe_id,
+                pub_date=pub_date,
+            )
+            for subscriber_id in Subscription.objects.filter(
+                publisher_id=author_id,
+            ).values_list('subscriber_id', flat=True).iterator()
+            for recipe_id, pub_date in recipes
+        ),
+        batch_size=settings.FEED_FANOUT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def remove_author_from_feed(subscriber_id, author_id):
+    """
+    После отписки убирает рецепты автора из ленты.
+    """
+    FeedEntry.objects.filter(
+        subscriber_id=subscriber_id,
+        recipe__author_id=author_id,
+    ).delete()
+
+
+def get_feed(user):
+    """
+    Рецепты авторов, на которых подписан пользователь, с датой
+    для сортировки ленты в аннотации feed_pub_date. Без популярных
+    авторов лента читается одним диапазоном индекса записей ленты,
+    иначе к ней добавляются рецепты популярных авторов.
+    """
+    popular_ids = get_popular_author_ids() & set(
+        user.subscriber.values_list('publisher', flat=True)
+    )
+    if not popular_ids:
+        return Recipe.objects.filter(
+            feed_entries__subscriber=user,
+        ).annotate(
+            feed_pub_date=F('feed_entries__pub_date'),
+        )
+    return Recipe.objects.filter(
+        Q(
+            Exists(
+                FeedEntry.objects.filter(
+                    subscriber=user,
+                    recipe=OuterRef('pk'),
+                )
+            )
+        )
+        | Q(author_id__in=popular_ids)
+    ).annotate(
+        feed_pub_date=F('pub_date'),
+    )
@@ -0,0 +1,217 @@
+import posixpath
+from base64 import b64encode
+from collections import Counter, defaultdict
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from PIL import Image, ImageOps
+
+from recipes.models import ImageStatus, Recipe, StoredFile
+
+# Форматы без прозрачности: альфа-канал заливается белым.
+OPAQUE_FORMATS = ('JPEG',)
+# Поля рецепта, которые заполняет обработка изображения.
+IMAGE_STATE_FIELDS = ('image_status', 'image_variants', 'image_placeholder')
+
+
+def get_image_storage():
+    return Recipe._meta.get_field('image').storage
+
+
+def get_variant_name(image_name: str, variant: str, extension: str) -> str:
+    """
+    Имя уменьшенной копии в каталоге recipes/variants/; хранилище
+    заменяет его на хеш содержимого.
+    """
+    stem, _ = posixpath.splitext(posixpath.basename(image_name))
+    return posixpath.join(
+        Recipe._meta.get_field('image').upload_to,
+        'variants',
+        f'{stem}_{variant}.{extension}',
+    )
+
+
+def prepare_image(image: Image.Image) -> Image.Image:
+    """
+    Поворачивает изображение по EXIF и приводит его к RGB или RGBA.
+    """
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGB', 'RGBA'):
+        return image
+    if image.mode in ('LA', 'PA') or 'transparency' in image.info:
+        return image.convert('RGBA')
+    return image.convert('RGB')
+
+
+def resize_to_width(image: Image.Image, width: int) -> Image.Image:
+    """
+    Уменьшает изображение до заданной ширины; меньшие не увеличиваются.
+    """
+    if image.width <= width:
+        return image
+    height = max(round(image.height * width / image.width), 1)
+    return image.resize(
+        (width, height), Image.LANCZOS, reducing_gap=3.0
+    )
+
+
+def encode_image(image: Image.Image, options: dict) -> bytes:
+    if options['format'] in OPAQUE_FORMATS and image.mode == 'RGBA':
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, **options)
+    return buffer.getvalue()
+
+
+def make_image_placeholder(image: Image.Image) -> str:
+    """
+    Крошечное превью изображения (LQIP) в виде data URI. Уменьшение
+    выполняет Pillow над всем массивом пикселей сразу, а reducing_gap
+    сначала сжимает изображение целочисленным усреднением блоков.
+    """
+    size = settings.RECIPE_IMAGE_PLACEHOLDER_SIZE
+    preview = image.copy()
+    preview.thumbnail((size, size), Image.BILINEAR, reducing_gap=2.0)
+    options = settings.RECIPE_IMAGE_PLACEHOLDER_FORMAT
+    data = b64encode(encode_image(preview, options)).decode()
+    return f'data:image/{options["format"].lower()};base64,{data}'
+
+
+def load_image_placeholder(image_name: str) -> str:
+    """
+    Превью для уже обработанного изображения (заполнение для старых
+    рецептов): JPEG сразу декодируется в уменьшенном масштабе.
+    """
+    size = settings.RECIPE_IMAGE_PLACEHOLDER_SIZE
+    storage = get_image_storage()
+    with storage.open(image_name) as file, Image.open(file) as original:
+        original.draft('RGB', (size * 4, size * 4))
+        return make_image_placeholder(prepare_image(original))
+
+
+def make_image_variants(image_name: str) -> tuple:
+    """
+    Создает уменьшенные копии изображения рецепта во всех форматах
+    и превью; возвращает имена и размеры копий и превью. Выполняется
+    в пуле процессов, поэтому к базе данных не обращается.
+    """
+    storage = get_image_storage()
+    with storage.open(image_name) as file, Image.open(file) as original:
+        image = prepare_image(original)
+        image.load()
+    variants = {'original': {'width': image.width, 'height': image.height}}
+    for variant, width in settings.RECIPE_IMAGE_VARIANTS.items():
+        resized = resize_to_width(image, width)
+        variants[variant] = {
+            'width': resized.width,
+            'height': resized.height,
+        }
+        for extension, options in settings.RECIPE_IMAGE_FORMATS.items():
+            name = get_variant_name(image_name, variant, extension)
+            variants[variant][extension] = storage.save(
+                name, ContentFile(encode_image(resized, options))
+            )
+    return variants, make_image_placeholder(image)
+
+
+def save_image_variants(
+    pk, image_name, old_variants, variants, placeholder, status
+):
+    """
+    Сохраняет копии изображения, если его не заменили, пока шла обработка,
+    и их еще не сохранил другой процесс.
+    """
+    with transaction.atomic():
+        updated = Recipe.objects.filter(
+            pk=pk, image=image_name, image_status=ImageStatus.PENDING
+        ).update(
+            image_status=status,
+            image_variants=variants,
+            image_placeholder=placeholder,
+        )
+        if updated:
+            change_file_references(
+                get_recipe_file_names(None, old_variants),
+                get_recipe_file_names(None, variants),
+            )
+
+
+def get_image_variants(recipe: Recipe, generate: bool = True) -> dict:
+    """
+    Уменьшенные копии изображения рецепта. Если фоновый обработчик
+    еще не создал их, копии создаются при первом обращении
+    и сохраняются в рецепте.
+    """
+    if not generate or recipe.image_status != ImageStatus.PENDING:
+        return recipe.image_variants
+    try:
+        variants, placeholder = make_image_variants(recipe.image.name)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        variants, placeholder, status = {}, '', ImageStatus.FAILED
+    else:
+        status = ImageStatus.READY
+    save_image_variants(
+        recipe.pk,
+        recipe.image.name,
+        recipe.image_variants,
+        variants,
+        placeholder,
+        status,
+    )
+    recipe.image_status = status
+    recipe.image_variants = variants
+    recipe.image_placeholder = placeholder
+    return variants
+
+
+def reload_image_state(recipe: Recipe):
+    """
+    Перечитывает из базы копии изображения, которые мог сохранить
+    обработчик после загрузки рецепта, чтобы при замене изображения
+    снять ссылки и с них.
+    """
+    recipe.refresh_from_db(fields=IMAGE_STATE_FIELDS)
+    recipe._image_files = get_recipe_file_names(
+        recipe.image.name, recipe.image_variants
+    )
+
+
+def get_recipe_file_names(image_name, variants) -> list:
+    """
+    Файлы хранилища, на которые ссылается рецепт.
+    """
+    names = [image_name] if image_name else []
+    for variant in variants.values():
+        names.extend(
+            value for key, value in variant.items()
+            if key not in ('width', 'height')
+        )
+    return names
+
+
+def change_file_references(old_names=(), new_names=()):
+    """
+    Уменьшает число ссылок на файлы old_names и увеличивает на new_names;
+    один файл может встречаться в списках несколько раз.
+    """
+    delta = Counter(new_names)
+    delta.subtract(old_names)
+    names_by_delta = defaultdict(list)
+    for name, change in delta.items():
+        if change:
+            names_by_delta[change].append(name)
+    for change, names in names_by_delta.items():
+        if change > 0:
+            StoredFile.objects.bulk_create(
+                (StoredFile(name=name) for name in names),
+                ignore_conflicts=True,
+            )
+        StoredFile.objects.filter(name__in=names).update(
+            references=Greatest(F('references') + change, 0)
+        )
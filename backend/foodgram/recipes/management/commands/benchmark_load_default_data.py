@@ -0,0 +1,108 @@
+import json
+import os
+import random
+import tempfile
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+
+from api.utils import measure
+from recipes.management.commands.load_default_data import \
+    Command as LoadDataCommand
+from recipes.management.commands.load_default_data import data_for_database
+
+MEASUREMENT_UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.')
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет скорость загрузки ингредиентов командой load_default_data '
+        'пачками INSERT и через COPY (только PostgreSQL) на синтетических '
+        'файлах разного размера. Загруженные данные откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            nargs='+',
+            default=[2000, 20000, 100000],
+            help='Число строк файла ингредиентов в замерах.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Число повторов каждого замера.',
+        )
+
+    def handle(self, *args, **options):
+        loader = LoadDataCommand(stdout=self.stdout)
+        methods = {'Пачки INSERT': loader.load}
+        if connection.vendor == 'postgresql':
+            methods['COPY'] = loader.load_with_copy
+        load_options = {
+            'batch_size': settings.DEFAULT_DATA_BATCH_SIZE,
+            'update': False,
+            'dry_run': False,
+        }
+        data_file = data_for_database[0]
+        self.stdout.write(f'СУБД: {connection.vendor}')
+        with tempfile.TemporaryDirectory() as directory:
+            for rows_count in options['rows']:
+                path = os.path.join(directory, f'{rows_count}.json')
+                write_rows(path, rows_count)
+                for name, load in methods.items():
+                    self.report(
+                        f'{name}, {rows_count} строк',
+                        rows_count,
+                        lambda: load(data_file, path, load_options),
+                        options['repeat'],
+                    )
+
+    def report(self, name, rows_count, load, repeat):
+        """
+        Скорость загрузки в пустую таблицу и повторной загрузки того же
+        файла, когда все строки пропускаются.
+        """
+        fresh_time = measure(lambda: rolled_back(load), repeat)
+        with transaction.atomic():
+            load()
+            reload_time = measure(load, repeat)
+            transaction.set_rollback(True)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{name}: загрузка {rows_count * 1000 / fresh_time:.0f} '
+                f'строк/с, повторная {rows_count * 1000 / reload_time:.0f} '
+                f'строк/с'
+            )
+        )
+
+
+def rolled_back(function):
+    """
+    Выполняет функцию в транзакции и откатывает ее изменения.
+    """
+    with transaction.atomic():
+        function()
+        transaction.set_rollback(True)
+
+
+def write_rows(path, rows_count):
+    """
+    Файл .json с уникальными синтетическими ингредиентами.
+    """
+    random.seed(rows_count)
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(
+            [
+                {
+                    'name': f'ингредиент для замера {number}',
+                    'measurement_unit': random.choice(MEASUREMENT_UNITS),
+                }
+                for number in range(rows_count)
+            ],
+            file,
+            ensure_ascii=False,
+        )
@@ -0,0 +1,83 @@
+import json
+import os
+import random
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from api.utils import measure
+from recipes.units import get_unit_table, normalize_shopping_list
+
+NON_CONVERTIBLE_UNITS = ('шт.', 'по вкусу', 'щепотка')
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет нормализацию единиц измерения списка покупок '
+        'на синтетических корзинах разного размера.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            nargs='+',
+            default=[1000, 10000, 100000],
+            help='Число строк списка покупок в замерах.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Число повторов каждого замера.',
+        )
+
+    def handle(self, *args, **options):
+        with open(
+            os.path.join(settings.DEFAULT_DATA_FILE_PATH, 'ingredients.json'),
+            encoding='utf-8',
+        ) as ingredients_file:
+            names = sorted(
+                {row['name'] for row in json.load(ingredients_file)}
+            )
+        get_unit_table.cache_clear()
+        load_time = measure(get_unit_table, 1)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Загрузка таблицы пересчета: {load_time:.2f} мс'
+            )
+        )
+        for rows_count in options['rows']:
+            rows = make_rows(names, rows_count)
+            merged_count = len(list(normalize_shopping_list(rows)))
+            milliseconds = measure(
+                lambda: list(normalize_shopping_list(rows)),
+                options['repeat'],
+            )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'{len(rows)} строк -> {merged_count}: '
+                    f'{milliseconds:.1f} мс, '
+                    f'{milliseconds * 1000 / len(rows):.2f} мкс на строку'
+                )
+            )
+
+
+def make_rows(names, rows_count):
+    """
+    Список покупок, упорядоченный по названию: у каждого ингредиента
+    от одной до трех строк в разных единицах измерения.
+    """
+    random.seed(rows_count)
+    units = list(get_unit_table()) + list(NON_CONVERTIBLE_UNITS)
+    rows = []
+    while len(rows) < rows_count:
+        name = f'{random.choice(names)} {len(rows)}'
+        for unit in random.sample(units, random.randint(1, 3)):
+            rows.append({
+                'name': name,
+                'measurement_unit': unit,
+                'amount': random.randint(1, 1000),
+            })
+    rows.sort(key=lambda row: (row['name'], row['measurement_unit']))
+    return rows[:rows_count]
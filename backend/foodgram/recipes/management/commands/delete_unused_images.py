@@ -0,0 +1,177 @@
+import os
+import time
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipes.images import get_image_storage, get_recipe_file_names
+from recipes.models import Recipe, StoredFile
+
+
+def iter_files(directory: str):
+    """
+    Потоково обходит дерево каталогов, не собирая список файлов целиком.
+    """
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_files(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет файлы изображений рецептов, на которые не ссылается '
+        'ни один рецепт.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-period',
+            type=int,
+            default=settings.RECIPE_IMAGE_GC_GRACE_PERIOD,
+            help=(
+                'Файлы моложе указанного числа секунд не удаляются: '
+                'их могли записать до сохранения рецепта.'
+            ),
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Число файлов, проверяемых одним запросом.',
+        )
+        parser.add_argument(
+            '--recount',
+            action='store_true',
+            help='Пересчитать ссылки на файлы по рецептам перед удалением.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только вывести число неиспользуемых файлов.',
+        )
+
+    def handle(self, *args, **options):
+        references = None
+        if options['recount']:
+            references = self.recount_references(
+                save=not options['dry_run']
+            )
+            if not options['dry_run']:
+                # Дальше ссылки читаются из сохраненной таблицы.
+                references = None
+        storage = get_image_storage()
+        root = storage.path(Recipe._meta.get_field('image').upload_to)
+        if not os.path.isdir(root):
+            self.stdout.write(self.style.SUCCESS('Файлов изображений нет.'))
+            return
+        deadline = time.time() - options['grace_period']
+        files = iter_files(root)
+        deleted, freed, kept = 0, 0, 0
+        while True:
+            batch = list(islice(files, options['batch_size']))
+            if not batch:
+                break
+            names = {
+                os.path.relpath(entry.path, storage.location).replace(
+                    os.sep, '/'
+                ): entry
+                for entry in batch
+            }
+            referenced = self.get_referenced(names, references)
+            unused = [
+                name for name, entry in names.items()
+                if name not in referenced
+                and entry.stat().st_mtime < deadline
+            ]
+            if not options['dry_run']:
+                unused = self.delete_files(storage, unused, deadline)
+            kept += len(names) - len(unused)
+            deleted += len(unused)
+            freed += sum(names[name].stat().st_size for name in unused)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{"Не используется" if options["dry_run"] else "Удалено"} '
+                f'файлов: {deleted} ({freed / 2 ** 20:.1f} МБ), '
+                f'оставлено: {kept}'
+            )
+        )
+
+    def delete_files(self, storage, names, deadline):
+        """
+        Удаляет файлы, еще раз проверив ссылки и дату изменения:
+        пока шла проверка пакета, файл могли загрузить повторно.
+        """
+        with transaction.atomic():
+            referenced = set(
+                StoredFile.objects.select_for_update().filter(
+                    name__in=names,
+                    references__gt=0,
+                ).values_list('name', flat=True)
+            )
+            unused = []
+            for name in names:
+                if name in referenced:
+                    continue
+                try:
+                    if os.stat(storage.path(name)).st_mtime >= deadline:
+                        continue
+                except FileNotFoundError:
+                    pass
+                storage.delete(name)
+                unused.append(name)
+            StoredFile.objects.filter(name__in=unused).delete()
+        return unused
+
+    def get_referenced(self, names, references=None):
+        """
+        Имена файлов, на которые ссылаются рецепты: по таблице ссылок
+        или по пересчету, который при --dry-run не сохраняется.
+        """
+        if references is not None:
+            return {name for name in names if references[name] > 0}
+        return set(
+            StoredFile.objects.filter(
+                name__in=names,
+                references__gt=0,
+            ).values_list('name', flat=True)
+        )
+
+    def recount_references(self, save=True):
+        """
+        Пересчитывает ссылки на файлы по рецептам; при save=False
+        таблица ссылок не меняется.
+        """
+        references = Counter()
+        for image_name, variants in Recipe.objects.values_list(
+            'image', 'image_variants'
+        ).iterator():
+            references.update(get_recipe_file_names(image_name, variants))
+        if not save:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Подсчитаны ссылки на файлы: {len(references)} '
+                    f'(без сохранения)'
+                )
+            )
+            return references
+        with transaction.atomic():
+            StoredFile.objects.all().delete()
+            StoredFile.objects.bulk_create(
+                (
+                    StoredFile(name=name, references=count)
+                    for name, count in references.items()
+                ),
+                batch_size=1000,
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Пересчитаны ссылки на файлы: {len(references)}'
+            )
+        )
+        return references
@@ -1,100 +1,359 @@
 import csv
-import json
+import io
 import os
-import sys
-from enum import Enum
-from typing import Dict
+import time
+from itertools import islice
+from typing import Dict, Iterator, NamedTuple, Tuple, Type
 
 from django.conf import settings
-from django.contrib.auth import get_user_model
-from django.core.management import BaseCommand
-from django.db import IntegrityError
+from django.core.management import BaseCommand, CommandError
+from django.db import IntegrityError, connection, models, transaction
 
+from api.cache import bump_resource_version
 from recipes.models import Ingredient, Tag
-
-User = get_user_model()
+from recipes.readers import iter_json_array
 
 DATA_DIRECTORY: str = settings.DEFAULT_DATA_FILE_PATH
-os.chdir(DATA_DIRECTORY)
+
+
+class DataFile(NamedTuple):
+    MODEL: Type[models.Model]
+    OPTION: str
+    FILENAME: str
+    FIELD_NAMES: Tuple[str, ...]
+    # Естественный ключ, по которому ищутся уже загруженные записи.
+    KEY_FIELDS: Tuple[str, ...]
+    # Версии кэша, которые сбрасываются после изменения данных.
+    RESOURCES: Tuple[str, ...]
+
 
 data_for_database = [
-    Enum(
-        'DataFile',
-        [
-            ('MODEL', Ingredient),
-            ('FILENAME', 'ingredients.json'),
-            ('FIELD_NAMES', ('name', 'measurement_unit')),
-        ]
+    DataFile(
+        MODEL=Ingredient,
+        OPTION='ingredients',
+        FILENAME='ingredients.json',
+        FIELD_NAMES=('name', 'measurement_unit'),
+        KEY_FIELDS=('name', 'measurement_unit'),
+        RESOURCES=('ingredients', 'recipes'),
     ),
-    Enum(
-        'DataFile',
-        [
-            ('MODEL', Tag),
-            ('FILENAME', 'default_tags.json'),
-            ('FIELD_NAMES', ('name', 'color', 'slug')),
-        ]
+    DataFile(
+        MODEL=Tag,
+        OPTION='tags',
+        FILENAME='default_tags.json',
+        FIELD_NAMES=('name', 'color', 'slug'),
+        KEY_FIELDS=('slug',),
+        RESOURCES=('tags', 'recipes'),
     ),
 ]
 
 
+def iter_data_rows(path: str, field_names: Tuple[str, ...]) -> Iterator:
+    """
+    Потоково читает строки из файла .csv (без заголовка) или .json.
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        if path.endswith('csv'):
+            reader = csv.DictReader(
+                file,
+                delimiter=',',
+                quotechar='"',
+                skipinitialspace=True,
+                fieldnames=field_names,
+            )
+        elif path.endswith('json'):
+            reader = iter_json_array(file)
+        else:
+            raise CommandError(f'Неизвестный формат файла {path}!')
+        for number, record in enumerate(reader, start=1):
+            if isinstance(record, ValueError):
+                raise CommandError(f'{path}, запись {number}: {record}')
+            try:
+                yield {field: record[field] for field in field_names}
+            except (KeyError, TypeError):
+                raise CommandError(
+                    f'{path}, запись {number}: ожидаются поля '
+                    f'{", ".join(field_names)}.'
+                )
+
+
+class CopyStream:
+    """
+    Файлоподобный объект для COPY FROM STDIN: строки данных в формате CSV
+    формируются по мере чтения, файл целиком в памяти не собирается.
+    """
+
+    def __init__(self, rows: Iterator, field_names: Tuple[str, ...]):
+        self.rows = rows
+        self.field_names = field_names
+        self.row_count = 0
+        self.buffer = ''
+        self.line = io.StringIO()
+        self.writer = csv.writer(self.line, lineterminator='\n')
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.row_count += 1
+            self.line.seek(0)
+            self.line.truncate()
+            self.writer.writerow(row[field] for field in self.field_names)
+            self.buffer += self.line.getvalue()
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def copy_data_rows(data_file: DataFile, rows: Iterator, update: bool):
+    """
+    Загружает строки в PostgreSQL через COPY во временную таблицу и
+    переносит их в таблицу модели одним INSERT ... ON CONFLICT.
+    Возвращает число добавленных и обновлённых записей и всех строк файла.
+    """
+    quote_name = connection.ops.quote_name
+    meta = data_file.MODEL._meta
+    table = quote_name(meta.db_table)
+    temp_table = quote_name(f'load_{meta.db_table}')
+    columns = [
+        quote_name(meta.get_field(field).column)
+        for field in data_file.FIELD_NAMES
+    ]
+    key_columns = [
+        quote_name(meta.get_field(field).column)
+        for field in data_file.KEY_FIELDS
+    ]
+    update_columns = [
+        column for column in columns if column not in key_columns
+    ]
+    column_list = ', '.join(columns)
+    key_list = ', '.join(key_columns)
+    if update and update_columns:
+        current = ', '.join(f'{table}.{column}' for column in update_columns)
+        excluded = ', '.join(f'EXCLUDED.{column}' for column in update_columns)
+        assignments = ', '.join(
+            f'{column} = EXCLUDED.{column}' for column in update_columns
+        )
+        conflict_action = (
+            f'UPDATE SET {assignments} '
+            f'WHERE ROW({current}) IS DISTINCT FROM ROW({excluded})'
+        )
+    else:
+        conflict_action = 'NOTHING'
+    stream = CopyStream(rows, data_file.FIELD_NAMES)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE {temp_table} ON COMMIT DROP AS '
+            f'SELECT {column_list} FROM {table} WITH NO DATA'
+        )
+        # Номер строки в файле: из повторов ключа берется первая строка,
+        # как и при загрузке пачками.
+        cursor.execute(
+            f'ALTER TABLE {temp_table} ADD COLUMN load_position BIGSERIAL'
+        )
+        cursor.copy_expert(
+            f'COPY {temp_table} ({column_list}) FROM STDIN WITH (FORMAT csv)',
+            stream,
+        )
+        # DISTINCT ON: одна команда не может изменить строку дважды.
+        # По xmax = 0 добавленные строки отличаются от обновлённых.
+        cursor.execute(
+            f'INSERT INTO {table} ({column_list}) '
+            f'SELECT DISTINCT ON ({key_list}) {column_list} '
+            f'FROM {temp_table} '
+            f'ORDER BY {key_list}, load_position '
+            f'ON CONFLICT ({key_list}) DO {conflict_action} '
+            'RETURNING xmax = 0'
+        )
+        results = [inserted for inserted, in cursor.fetchall()]
+        # Внутри внешней транзакции таблица дожила бы до ее конца
+        # и помешала бы следующей загрузке.
+        cursor.execute(f'DROP TABLE {temp_table}')
+    inserted = sum(results)
+    return inserted, len(results) - inserted, stream.row_count
+
+
 class Command(BaseCommand):
-    help = 'Загружает данные из файлов .csv или .json в базу данных.'
+    help = (
+        'Загружает данные из файлов .csv или .json в базу данных; '
+        'уже загруженные записи пропускаются, поэтому команду можно '
+        'запускать повторно.'
+    )
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
         for data_file in data_for_database:
+            parser.add_argument(
+                f'--{data_file.OPTION}',
+                default=os.path.join(DATA_DIRECTORY, data_file.FILENAME),
+                help=(
+                    f'Путь к файлу .csv или .json с данными модели '
+                    f'{data_file.MODEL.__name__}.'
+                ),
+            )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.DEFAULT_DATA_BATCH_SIZE,
+            help='Число строк, записываемых в базу одним запросом.',
+        )
+        parser.add_argument(
+            '--update',
+            action='store_true',
+            help='Обновлять поля уже загруженных записей данными из файла.',
+        )
+        parser.add_argument(
+            '--fast',
+            action='store_true',
+            help=(
+                'Загружать данные через COPY во временную таблицу '
+                '(только PostgreSQL, для других СУБД - пачками INSERT).'
+            ),
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Посчитать изменения, не записывая их в базу.',
+        )
+
+    def handle(self, *args, **options):
+        use_copy = options['fast'] and connection.vendor == 'postgresql'
+        if options['fast'] and not use_copy:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'COPY недоступен для {connection.vendor}, '
+                    'данные загружаются пачками INSERT.'
+                )
+            )
+        for data_file in data_for_database:
+            path = options[data_file.OPTION]
+            started = time.perf_counter()
             try:
-                objects_queue = []
-                if data_file.FILENAME.value.endswith('csv'):
-                    with open(
-                        data_file.FILENAME.value, 'r', encoding='utf-8'
-                    ) as file:
-                        reader = csv.DictReader(
-                            file,
-                            delimiter=',',
-                            quotechar='"',
-                            skipinitialspace=True,
-                            fieldnames=data_file.FIELD_NAMES.value,
-                        )
-                        for row in reader:
-                            data_args: Dict[str, str] = dict(**row)
-                            objects_queue.append(
-                                data_file.MODEL.value(**data_args)
-                            )
-
-                elif data_file.FILENAME.value.endswith('json'):
-                    with open(data_file.FILENAME.value, 'rb') as json_file:
-                        full_data_from_file = json.load(json_file)
-                        for record in full_data_from_file:
-                            new_obj = data_file.MODEL.value(**record)
-                            objects_queue.append(new_obj)
-
-                data_file.MODEL.value.objects.bulk_create(objects_queue)
+                if use_copy:
+                    counts = self.load_with_copy(data_file, path, options)
+                else:
+                    counts = self.load(data_file, path, options)
             except FileNotFoundError:
-                self.stdout.write(
-                    self.style.ERROR(
-                        f'Файла {data_file.FILENAME.value} нет в '
-                        'рабочем каталоге!\nРабота загрузчика прервана!'
-                    )
+                raise CommandError(
+                    f'Файла {path} не существует!\n'
+                    'Работа загрузчика прервана!'
                 )
-                sys.exit()
-            except IntegrityError:
-                self.stdout.write(
-                    self.style.ERROR(
-                        f'Oшибка при работе с файлом '
-                        f'{data_file.FILENAME.value}\n'
-                        'Работа загрузчика прервана!'
-                    )
+            except IntegrityError as error:
+                raise CommandError(
+                    f'Oшибка при работе с файлом {path}: {error}\n'
+                    'Работа загрузчика прервана!'
                 )
-                sys.exit()
-            else:
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f'Данные из файла {data_file.FILENAME.value} '
-                        'успешно загружены'
-                    )
+            elapsed = max(time.perf_counter() - started, 1e-6)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'{path}: добавлено {counts["inserted"]}, '
+                    f'обновлено {counts["updated"]}, '
+                    f'пропущено {counts["skipped"]} '
+                    f'({sum(counts.values()) / elapsed:.0f} строк/с)'
+                )
+            )
+        if options['dry_run']:
+            self.stdout.write(
+                self.style.WARNING(
+                    'Пробный запуск: изменения не сохранены.'
                 )
+            )
         self.stdout.write(
             self.style.SUCCESS(
                 '\n--- Работа загрузчика завершена успешно ---!\n'
             )
         )
+
+    def load(self, data_file: DataFile, path: str, options) -> Dict:
+        counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+        seen_keys = set()
+        rows = iter_data_rows(path, data_file.FIELD_NAMES)
+        while True:
+            batch = list(islice(rows, options['batch_size']))
+            if not batch:
+                break
+            unique_rows = {}
+            for row in batch:
+                key = tuple(row[field] for field in data_file.KEY_FIELDS)
+                if key in seen_keys:
+                    counts['skipped'] += 1
+                    continue
+                seen_keys.add(key)
+                unique_rows[key] = row
+            self.load_batch(data_file, unique_rows, counts, options)
+        self.bump_versions(data_file, counts, options)
+        return counts
+
+    def load_with_copy(self, data_file: DataFile, path: str, options):
+        rows = iter_data_rows(path, data_file.FIELD_NAMES)
+        with transaction.atomic():
+            inserted, updated, total = copy_data_rows(
+                data_file, rows, options['update']
+            )
+            # Пробный запуск считает изменения и откатывает их.
+            transaction.set_rollback(options['dry_run'])
+        counts = {
+            'inserted': inserted,
+            'updated': updated,
+            'skipped': total - inserted - updated,
+        }
+        self.bump_versions(data_file, counts, options)
+        return counts
+
+    def bump_versions(self, data_file: DataFile, counts, options):
+        """
+        Массовая загрузка не отправляет сигналы моделей, поэтому версии
+        кэша сбрасываются явно.
+        """
+        changed = counts['inserted'] or counts['updated']
+        if changed and not options['dry_run']:
+            for resource in data_file.RESOURCES:
+                bump_resource_version(resource)
+
+    def load_batch(self, data_file: DataFile, rows: Dict, counts, options):
+        """
+        Одним запросом находит уже загруженные записи пачки: новые
+        добавляются, изменившиеся обновляются (с --update), остальные
+        пропускаются.
+        """
+        model = data_file.MODEL
+        first_key = data_file.KEY_FIELDS[0]
+        update_fields = [
+            field for field in data_file.FIELD_NAMES
+            if field not in data_file.KEY_FIELDS
+        ]
+        existing = {
+            tuple(getattr(obj, field) for field in data_file.KEY_FIELDS): obj
+            for obj in model.objects.filter(**{
+                f'{first_key}__in': {row[first_key] for row in rows.values()}
+            })
+        }
+        objects_to_create, objects_to_update = [], []
+        for key, row in rows.items():
+            obj = existing.get(key)
+            if obj is None:
+                objects_to_create.append(model(**row))
+            elif options['update'] and any(
+                getattr(obj, field) != row[field] for field in update_fields
+            ):
+                for field in update_fields:
+                    setattr(obj, field, row[field])
+                objects_to_update.append(obj)
+            else:
+                counts['skipped'] += 1
+        counts['inserted'] += len(objects_to_create)
+        counts['updated'] += len(objects_to_update)
+        if options['dry_run']:
+            return
+        with transaction.atomic():
+            model.objects.bulk_create(
+                objects_to_create,
+                batch_size=options['batch_size'],
+                ignore_conflicts=True,
+            )
+            if objects_to_update:
+                model.objects.bulk_update(
+                    objects_to_update,
+                    update_fields,
+                    batch_size=options['batch_size'],
+                )
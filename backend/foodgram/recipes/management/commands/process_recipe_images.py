@@ -0,0 +1,156 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from api.cache import bump_resource_version
+from recipes.images import (load_image_placeholder, make_image_variants,
+                            save_image_variants)
+from recipes.models import ImageStatus, Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает уменьшенные копии изображений рецептов, ожидающих '
+        'обработки, в пуле процессов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.RECIPE_IMAGE_WORKERS,
+            help='Число процессов, обрабатывающих изображения.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='Число изображений, выбираемых из очереди за раз.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Пауза в секундах, если очередь пуста.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать текущую очередь и завершить работу.',
+        )
+        parser.add_argument(
+            '--placeholders',
+            action='store_true',
+            help=(
+                'Создать превью для уже обработанных изображений, '
+                'у которых его нет, и завершить работу.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        # Процессы запускаются через spawn и не наследуют соединения
+        # с базой данных родительского процесса.
+        with ProcessPoolExecutor(
+            max_workers=options['workers'],
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        ) as executor:
+            if options['placeholders']:
+                self.fill_placeholders(executor, options)
+                return
+            while True:
+                processed = self.process_batch(executor, options)
+                if processed:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+
+    def process_batch(self, executor, options) -> int:
+        recipes = list(
+            Recipe.objects.filter(
+                image_status=ImageStatus.PENDING,
+            ).exclude(
+                image='',
+            ).values_list(
+                'pk', 'image', 'image_variants',
+            )[:options['batch_size']]
+        )
+        futures = {
+            executor.submit(make_image_variants, image_name): (
+                pk, image_name, old_variants
+            )
+            for pk, image_name, old_variants in recipes
+        }
+        for future in as_completed(futures):
+            pk, image_name, old_variants = futures[future]
+            try:
+                variants, placeholder = future.result()
+                status = ImageStatus.READY
+            except Exception as error:
+                variants, placeholder, status = {}, '', ImageStatus.FAILED
+                self.stdout.write(
+                    self.style.ERROR(f'{image_name}: {error}')
+                )
+            save_image_variants(
+                pk, image_name, old_variants, variants, placeholder, status
+            )
+        if recipes:
+            bump_resource_version('recipes')
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Обработано изображений: {len(recipes)}'
+                )
+            )
+        return len(recipes)
+
+    def fill_placeholders(self, executor, options):
+        """
+        Заполняет превью старых рецептов и выводит скорость обработки.
+        """
+        started = time.perf_counter()
+        processed = 0
+        while True:
+            recipes = list(
+                Recipe.objects.filter(
+                    image_status=ImageStatus.READY,
+                    image_placeholder='',
+                ).exclude(
+                    image='',
+                ).values_list('pk', 'image')[:options['batch_size']]
+            )
+            if not recipes:
+                break
+            futures = {
+                executor.submit(load_image_placeholder, image_name): (
+                    pk, image_name
+                )
+                for pk, image_name in recipes
+            }
+            for future in as_completed(futures):
+                pk, image_name = futures[future]
+                try:
+                    changes = {'image_placeholder': future.result()}
+                except Exception as error:
+                    # Иначе рецепт снова попадет в выборку.
+                    changes = {'image_status': ImageStatus.FAILED}
+                    self.stdout.write(
+                        self.style.ERROR(f'{image_name}: {error}')
+                    )
+                Recipe.objects.filter(pk=pk, image=image_name).update(
+                    **changes
+                )
+            processed += len(recipes)
+        if processed:
+            bump_resource_version('recipes')
+        elapsed = max(time.perf_counter() - started, 1e-6)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Создано превью: {processed} '
+                f'({processed / elapsed:.1f} изобр./с)'
+            )
+        )
@@ -0,0 +1,46 @@
+from itertools import islice
+
+from django.core.management import BaseCommand
+
+from recipes.models import ShoppingCart, ShoppingListItem
+from recipes.utils import rebuild_shopping_lists
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает итоговые списки покупок пользователей по их '
+        'корзинам и удаляет позиции с нулевым количеством.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Число пользователей, пересчитываемых в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        user_ids = iter(
+            sorted(
+                set(
+                    ShoppingCart.objects.values_list(
+                        'user', flat=True
+                    ).order_by().distinct()
+                ) | set(
+                    ShoppingListItem.objects.values_list(
+                        'user', flat=True
+                    ).order_by().distinct()
+                )
+            )
+        )
+        rebuilt = 0
+        while True:
+            batch = list(islice(user_ids, options['batch_size']))
+            if not batch:
+                break
+            rebuild_shopping_lists(batch)
+            rebuilt += len(batch)
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересчитано списков покупок: {rebuilt}')
+        )
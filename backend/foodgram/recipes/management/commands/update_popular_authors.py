@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from recipes.feeds import update_popular_author_ids
+
+
+class Command(BaseCommand):
+    help = (
+        'Периодически пересчитывает популярных авторов, рецепты которых '
+        'не рассылаются по лентам, и дозаполняет ленты подписчиков '
+        'авторов, переставших быть популярными.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=settings.FEED_POPULAR_AUTHORS_REFRESH_INTERVAL,
+            help='Пауза в секундах между пересчетами.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Пересчитать один раз и завершить работу.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            popular_ids, demoted_ids = update_popular_author_ids()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Популярных авторов: {len(popular_ids)}, '
+                    f'ленты дозаполнены для {len(demoted_ids)}'
+                )
+            )
+            if options['once']:
+                break
+            time.sleep(options['interval'])
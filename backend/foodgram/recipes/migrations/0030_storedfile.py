@@ -0,0 +1,56 @@
+# Generated by Django 3.2 on 2026-10-18 05:44
+
+from collections import Counter
+
+from django.db import migrations, models
+import recipes.storage
+
+
+def count_file_references(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    StoredFile = apps.get_model('recipes', 'StoredFile')
+    references = Counter()
+    for image_name, variants in Recipe.objects.values_list(
+        'image', 'image_variants'
+    ).iterator():
+        if image_name:
+            references[image_name] += 1
+        for variant in variants.values():
+            references.update(
+                value for key, value in variant.items()
+                if key not in ('width', 'height')
+            )
+    StoredFile.objects.bulk_create(
+        StoredFile(name=name, references=count)
+        for name, count in references.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0029_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Имя файла')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Число ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл изображения',
+                'verbose_name_plural': 'Файлы изображений',
+            },
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(help_text='Загрузите изображение рецепта', storage=recipes.storage.ContentAddressedStorage(), upload_to='recipes/', verbose_name='Изображение для рецепта'),
+        ),
+        migrations.RunPython(
+            count_file_references, migrations.RunPython.noop
+        ),
+    ]
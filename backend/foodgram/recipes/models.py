@@ -4,6 +4,7 @@ from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
 
+from recipes.storage import ContentAddressedStorage
 from recipes.validators import validate_for_nonpunctuation_marks
 
 User = get_user_model()
@@ -83,6 +84,16 @@ class Ingredient(models.Model):
         return f'{self.name} ({self.measurement_unit})'
 
 
+class ImageStatus(models.TextChoices):
+    """
+    Состояние обработки изображения рецепта.
+    """
+
+    PENDING = 'pending', 'Ожидает обработки'
+    READY = 'ready', 'Обработано'
+    FAILED = 'failed', 'Ошибка обработки'
+
+
 class Recipe(models.Model):
     """
     Модель рецепта.
@@ -117,9 +128,30 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/',
+        storage=ContentAddressedStorage(),
         verbose_name='Изображение для рецепта',
         help_text='Загрузите изображение рецепта',
     )
+    image_status = models.CharField(
+        verbose_name='Состояние обработки изображения',
+        max_length=16,
+        choices=ImageStatus.choices,
+        default=ImageStatus.PENDING,
+        db_index=True,
+        editable=False,
+    )
+    image_variants = models.JSONField(
+        verbose_name='Уменьшенные копии изображения',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
+    image_placeholder = models.TextField(
+        verbose_name='Превью изображения (data URI)',
+        default='',
+        blank=True,
+        editable=False,
+    )
     tags = models.ManyToManyField(
         'Tag',
         related_name='recipes',
@@ -135,6 +167,12 @@ class Recipe(models.Model):
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['pub_date']
+        indexes = [
+            models.Index(
+                fields=['pub_date', 'id'],
+                name='recipe_pub_date_id_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         """
@@ -143,6 +181,34 @@ class Recipe(models.Model):
         return f'{self.name}'
 
 
+class StoredFile(models.Model):
+    """
+    Файл хранилища изображений рецептов и число ссылок на него
+    (оригиналы и уменьшенные копии); файлы без ссылок удаляет
+    команда delete_unused_images.
+    """
+
+    name = models.CharField(
+        verbose_name='Имя файла',
+        max_length=255,
+        unique=True,
+    )
+    references = models.PositiveIntegerField(
+        verbose_name='Число ссылок',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Файл изображения'
+        verbose_name_plural = 'Файлы изображений'
+
+    def __str__(self) -> str:
+        """
+        Строковое представление файла хранилища.
+        """
+        return f'{self.name} ({self.references})'
+
+
 class IngredientAmount(models.Model):
     """
     Промежуточная модель количества ингредиентов.
@@ -251,3 +317,86 @@ class ShoppingCart(models.Model):
             f'Рецепт "{self.recipe}" находится в списке покупок'
             f' пользователя "{self.user}"'
         )
+
+
+class ShoppingListItem(models.Model):
+    """
+    Итоговое количество ингредиента в списке покупок пользователя;
+    поддерживается при изменении корзины и ингредиентов рецептов.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Ингредиент',
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name='Общее количество',
+    )
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'
+            ),
+        ]
+
+    def __str__(self) -> str:
+        """
+        Строковое представление позиции списка покупок.
+        """
+        return f'{self.user}: {self.ingredient} - {self.total_amount}'
+
+
+class FeedEntry(models.Model):
+    """
+    Запись ленты подписок: рецепт автора, на которого подписан
+    пользователь. Записи создаются при публикации рецепта, дата
+    публикации копируется, чтобы лента читалась одним индексом.
+    """
+    subscriber = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации рецепта',
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['subscriber', 'recipe'],
+                name='unique_feed_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['subscriber', 'pub_date', 'recipe'],
+                name='feed_entry_timeline_idx',
+            ),
+        ]
+
+    def __str__(self) -> str:
+        """
+        Строковое представление записи ленты.
+        """
+        return f'{self.subscriber}: {self.recipe}'
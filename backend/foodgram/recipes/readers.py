@@ -0,0 +1,63 @@
+import json
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class PrependedStream:
+    """
+    Текстовый поток с уже прочитанным началом.
+    """
+
+    def __init__(self, head, stream):
+        self.head = head
+        self.stream = stream
+
+    def read(self, size=-1):
+        head, self.head = self.head, ''
+        return head + self.stream.read(size)
+
+    def __iter__(self):
+        head, self.head = self.head, ''
+        yield head + self.stream.readline()
+        yield from self.stream
+
+
+def iter_json_array(text_stream):
+    """
+    Потоково читает объекты из JSON-массива, не загружая файл целиком;
+    ошибка разбора возвращается последней записью как ValueError.
+    """
+    decoder = json.JSONDecoder()
+    # Поток начинается с открывающей скобки массива.
+    buffer = text_stream.read(READ_CHUNK_SIZE).lstrip()[1:]
+    while True:
+        buffer = buffer.lstrip()
+        if buffer.startswith(','):
+            buffer = buffer[1:].lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            record, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = text_stream.read(READ_CHUNK_SIZE)
+            if not chunk:
+                yield ValueError('Некорректный JSON-массив.')
+                return
+            buffer += chunk
+            continue
+        yield record
+        buffer = buffer[end:]
+
+
+def iter_ndjson(text_stream):
+    """
+    Читает объекты из NDJSON (один JSON-объект в строке); вместо строки,
+    которую не удалось разобрать, возвращается ValueError.
+    """
+    for line in text_stream:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as error:
+            yield ValueError(f'Некорректный JSON: {error}')
@@ -0,0 +1,108 @@
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from recipes.feeds import (add_author_to_feed, push_recipes_to_feeds,
+                           remove_author_from_feed)
+from recipes.images import change_file_references, get_recipe_file_names
+from recipes.models import ImageStatus, Recipe, ShoppingCart
+from recipes.utils import apply_recipe_to_shopping_list
+from users.models import Subscription
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_recipe_to_shopping_list(sender, instance, created, **kwargs):
+    """
+    Добавляет ингредиенты рецепта в итоговый список покупок.
+    """
+    if created:
+        apply_recipe_to_shopping_list(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_recipe_from_shopping_list(sender, instance, **kwargs):
+    """
+    Вычитает ингредиенты рецепта из итогового списка покупок; выполняется
+    до удаления, пока ингредиенты рецепта еще существуют (в том числе
+    при каскадном удалении рецепта).
+    """
+    apply_recipe_to_shopping_list(
+        instance.user_id, instance.recipe_id, sign=-1
+    )
+
+
+@receiver(pre_save, sender=Recipe)
+def queue_image_processing(sender, instance, **kwargs):
+    """
+    Новое изображение рецепта ставится в очередь: уменьшенные копии
+    создает команда process_recipe_images, запрос их не ждет.
+    """
+    if instance.image and not instance.image._committed:
+        instance.image_status = ImageStatus.PENDING
+        instance.image_variants = {}
+        instance.image_placeholder = ''
+
+
+@receiver(post_init, sender=Recipe)
+def remember_image_files(sender, instance, **kwargs):
+    """
+    Запоминает файлы, на которые ссылался рецепт при загрузке; пока поля
+    изображения не прочитаны, в __dict__ хранится имя файла.
+    """
+    if {'image', 'image_variants'} & instance.get_deferred_fields():
+        instance._image_files = None
+        return
+    instance._image_files = get_recipe_file_names(
+        str(instance.__dict__['image'] or ''), instance.image_variants
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def update_image_file_references(sender, instance, created, **kwargs):
+    """
+    Переносит ссылки со старых файлов изображения на новые.
+    """
+    old_files = [] if created else instance._image_files
+    if old_files is None:
+        return
+    new_files = get_recipe_file_names(
+        instance.image.name, instance.image_variants
+    )
+    change_file_references(old_files, new_files)
+    instance._image_files = new_files
+
+
+@receiver(post_delete, sender=Recipe)
+def release_image_files(sender, instance, **kwargs):
+    """
+    Снимает ссылки удаленного рецепта с файлов изображения.
+    """
+    change_file_references(
+        get_recipe_file_names(instance.image.name, instance.image_variants)
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def push_recipe_to_feeds(sender, instance, created, **kwargs):
+    """
+    Новый рецепт попадает в ленты подписчиков автора.
+    """
+    if created:
+        push_recipes_to_feeds([instance])
+
+
+@receiver(post_save, sender=Subscription)
+def fill_feed_on_subscribe(sender, instance, created, **kwargs):
+    """
+    После подписки в ленту добавляются последние рецепты автора.
+    """
+    if created:
+        add_author_to_feed(instance.subscriber_id, instance.publisher_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def clean_feed_on_unsubscribe(sender, instance, **kwargs):
+    """
+    После отписки рецепты автора убираются из ленты.
+    """
+    remove_author_from_feed(instance.subscriber_id, instance.publisher_id)
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from recipes.images import get_image_storage
+from recipes.models import StoredFile
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class DeleteUnusedImagesTest(TestCase):
+    """
+    Удаление файлов изображений, на которые не ссылаются рецепты.
+    """
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        storage = get_image_storage()
+        self.name = storage.save('recipes/orphan.png', ContentFile(b'png'))
+        self.path = storage.path(self.name)
+        os.utime(self.path, (0, 0))
+        # Устаревший счетчик: рецептов, ссылающихся на файл, нет.
+        StoredFile.objects.create(name=self.name, references=1)
+
+    def delete_unused_images(self, **options):
+        output = StringIO()
+        call_command('delete_unused_images', stdout=output, **options)
+        return output.getvalue()
+
+    def test_dry_run_recount_does_not_write(self):
+        output = self.delete_unused_images(recount=True, dry_run=True)
+        self.assertIn('Не используется файлов: 1', output)
+        self.assertEqual(
+            StoredFile.objects.get(name=self.name).references, 1
+        )
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_recount_deletes_unreferenced_files(self):
+        output = self.delete_unused_images(recount=True)
+        self.assertIn('Удалено файлов: 1', output)
+        self.assertFalse(StoredFile.objects.filter(name=self.name).exists())
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_reupload_refreshes_grace_period(self):
+        StoredFile.objects.filter(name=self.name).update(references=0)
+        get_image_storage().save('recipes/copy.png', ContentFile(b'png'))
+        output = self.delete_unused_images()
+        self.assertIn('Удалено файлов: 0', output)
+        self.assertTrue(os.path.exists(self.path))
@@ -0,0 +1,74 @@
+import json
+import os
+from functools import lru_cache
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+
+UNIT_CONVERSIONS_FILENAME = 'unit_conversions.json'
+
+
+@lru_cache(maxsize=None)
+def get_unit_table():
+    """
+    Таблица пересчета единиц измерения (загружается один раз):
+    единица -> (семейство, множитель к базовой единице, базовая единица).
+    """
+    with open(
+        os.path.join(
+            settings.DEFAULT_DATA_FILE_PATH, UNIT_CONVERSIONS_FILENAME
+        ),
+        encoding='utf-8',
+    ) as conversions_file:
+        families = json.load(conversions_file)
+    return {
+        unit: (family, factor, family_data['canonical_unit'])
+        for family, family_data in families.items()
+        for unit, factor in family_data['factors'].items()
+    }
+
+
+def round_amount(amount):
+    """
+    Округляет количество; целые значения возвращаются как int.
+    """
+    amount = round(amount, 2)
+    return int(amount) if amount == int(amount) else amount
+
+
+def merge_ingredient_rows(rows):
+    """
+    Объединяет строки одного ингредиента с совместимыми единицами
+    измерения (например, "г" и "кг"), пересчитывая их в базовую
+    единицу семейства; строки без пары остаются без изменений.
+    """
+    unit_table = get_unit_table()
+    groups = {}
+    for row in rows:
+        unit = row['measurement_unit']
+        group_key = unit_table[unit][0] if unit in unit_table else unit
+        groups.setdefault(group_key, []).append(row)
+    for group_rows in groups.values():
+        if len(group_rows) == 1:
+            yield group_rows[0]
+            continue
+        canonical_unit = unit_table[group_rows[0]['measurement_unit']][2]
+        yield {
+            'name': group_rows[0]['name'],
+            'measurement_unit': canonical_unit,
+            'amount': round_amount(sum(
+                row['amount'] * unit_table[row['measurement_unit']][1]
+                for row in group_rows
+            )),
+        }
+
+
+def normalize_shopping_list(rows):
+    """
+    Нормализует список покупок, упорядоченный по названию: строки
+    одного ингредиента в разных, но совместимых единицах сливаются
+    в одну. Работает потоково - по группам соседних строк.
+    """
+    for _, ingredient_rows in groupby(rows, key=itemgetter('name')):
+        yield from merge_ingredient_rows(ingredient_rows)
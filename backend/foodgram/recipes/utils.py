@@ -0,0 +1,93 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from recipes.models import IngredientAmount, ShoppingCart, ShoppingListItem
+
+
+def apply_recipe_to_shopping_list(user_id, recipe_id, sign=1):
+    """
+    Добавляет (sign=1) или вычитает (sign=-1) ингредиенты рецепта
+    в итоговом списке покупок пользователя. Недостающие позиции
+    создаются с пропуском конфликтов, итоги меняются одним UPDATE
+    относительно текущего значения, поэтому одновременные изменения
+    корзины не теряются. Позиции с нулевым количеством остаются
+    в таблице и не попадают в список покупок.
+    """
+    delta = defaultdict(int)
+    for ingredient_id, amount in IngredientAmount.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('ingredient_id', 'amount'):
+        delta[ingredient_id] += sign * amount
+    if not delta:
+        return
+    with transaction.atomic():
+        if sign > 0:
+            ShoppingListItem.objects.bulk_create(
+                (
+                    ShoppingListItem(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        total_amount=0,
+                    )
+                    for ingredient_id in sorted(delta)
+                ),
+                ignore_conflicts=True,
+            )
+        ShoppingListItem.objects.filter(
+            user_id=user_id,
+            ingredient_id__in=delta,
+        ).update(
+            total_amount=Greatest(
+                F('total_amount') + Case(
+                    *(
+                        When(ingredient_id=ingredient_id, then=Value(change))
+                        for ingredient_id, change in delta.items()
+                    ),
+                    output_field=IntegerField(),
+                ),
+                0,
+            )
+        )
+
+
+def rebuild_shopping_lists(user_ids):
+    """
+    Полностью пересчитывает итоговые списки покупок пользователей.
+    """
+    if not user_ids:
+        return
+    with transaction.atomic():
+        ShoppingListItem.objects.filter(user_id__in=user_ids).delete()
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(
+                user_id=row['user'],
+                ingredient_id=row['recipe__ingredients__ingredient'],
+                total_amount=row['total_amount'],
+            )
+            for row in ShoppingCart.objects.filter(
+                user_id__in=user_ids,
+                recipe__ingredients__isnull=False,
+            ).values(
+                'user',
+                'recipe__ingredients__ingredient',
+            ).annotate(
+                total_amount=Sum('recipe__ingredients__amount'),
+            ).order_by()
+        )
+
+
+def rebuild_shopping_lists_for_recipe(recipe):
+    """
+    Пересчитывает списки покупок пользователей, у которых рецепт
+    находится в корзине (после изменения его ингредиентов).
+    """
+    rebuild_shopping_lists(
+        list(
+            ShoppingCart.objects.filter(
+                recipe=recipe
+            ).values_list('user', flat=True)
+        )
+    )